@@ -1,29 +1,44 @@
+import time
+_import_started = (time.perf_counter(), time.process_time())  # Inicio de la importación, para --profile-startup
 import sys
 import os
 import json
-from datetime import datetime, timedelta
+import sqlite3
+import argparse
+import subprocess
+import bisect
+import hashlib
+import itertools
+import tempfile
+import threading
+import unicodedata
+import functools
+import platform
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QVBoxLayout,
     QHBoxLayout, QGridLayout, QScrollArea, QMainWindow,
     QListWidget, QListWidgetItem, QStackedLayout, QLineEdit,
-    QComboBox, QTableWidget, QTableWidgetItem, QFrame,
+    QComboBox, QTableView, QFrame,
     QMessageBox, QInputDialog, QFileDialog, QDialog,
-    QProgressBar, QSplashScreen, QGraphicsDropShadowEffect,
+    QProgressBar, QSplashScreen, QGraphicsEffect, QGraphicsBlurEffect, QGraphicsScene,
     QHeaderView, QSizePolicy, QTextEdit, QSpacerItem,
-    QCheckBox, QSlider, QGroupBox, QFormLayout
+    QCheckBox, QSlider, QGroupBox, QFormLayout, QListView,
+    QStyledItemDelegate, QStyle, QStyleOptionViewItem, QStatusBar
 )
 from PyQt5.QtGui import (
     QPixmap, QIcon, QCursor, QFont, QColor, QFontDatabase, 
-    QPainter, QLinearGradient, QPalette, QBrush
+    QPainter, QLinearGradient, QPalette, QBrush, QPen, QImage, QImageReader, QPainterPath
+)
+from PyQt5.QtCore import (
+    Qt, QTimer, QSize, QPoint, QThread, pyqtSignal, QPropertyAnimation, QEasingCurve,
+    QObject, QRunnable, QThreadPool,
+    QAbstractListModel, QAbstractTableModel, QSortFilterProxyModel, QModelIndex, QRect, QRectF,
+    QEvent, QPointF
 )
-from PyQt5.QtCore import Qt, QTimer, QSize, QPoint, QThread, pyqtSignal, QPropertyAnimation, QEasingCurve
-
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
-
-# Configuración de Matplotlib
-plt.rcParams['toolbar'] = 'None'
 
 # Colores y Temas Mejorados
 COLOR_PRIMARY = "#FF6B35"
@@ -89,26 +104,469 @@ THEME_DARK = {
 DEFAULT_IMAGE_PATH = "default.png"
 DATA_FILE = "productos.json"
 USER_DATA_FILE = "user_data.json"
+DB_FILE = "productos.db"
+SEARCH_DEBOUNCE_MS = 150  # Espera tras la última tecla antes de buscar
+VIEW_PREWARM_DELAY_MS = 1500  # Espera tras el arranque antes de precargar las pantallas restantes
+VIEW_PREWARM_INTERVAL_MS = 400  # Pausa entre pantallas precargadas, para no bloquear la interfaz
+SAVE_COALESCE_DELAY = 0.3  # Segundos que se esperan para agrupar guardados seguidos
+JOURNAL_FILE = "productos.journal"
+JOURNAL_COMPACT_BYTES = 256 * 1024  # Tamaño del diario a partir del cual se compacta
+SALES_LEDGER_FILE = "ventas.journal"  # Libro de ventas: una línea JSON por producto vendido
+SALES_ROLLUP_FILE = "ventas_resumen.json"  # Totales por día, mes, categoría y producto del libro de ventas
+SALES_ROLLUP_EVERY = 1000  # Líneas vendidas entre guardados de los totales (al salir se guardan siempre)
+REPORT_MONTHS = 8  # Meses que muestra el gráfico de ganancias
+CHART_CACHE_ENTRIES = 16  # Gráficos dibujados que se conservan (por datos, tema y tamaño)
+ABC_SHARES = (0.80, 0.95)  # Parte acumulada de los ingresos que cierra las clases A y B
+DEAD_STOCK_DAYS = 90  # Días sin ventas a partir de los que el stock se considera muerto
+LOW_COVER_DAYS = 7  # Cobertura por debajo de la cual un producto corre riesgo de agotarse
+ANALYTICS_BUDGET_MS = 50  # Tiempo máximo de cada cálculo con 1M productos (--benchmark-analytics)
+ANALYTICS_TOTAL_BUDGET_MS = 150  # Tiempo máximo de la analítica completa, en segundo plano
+STORAGE_BACKEND = "json"  # "json", "journal" o "sqlite"; se puede cambiar en Mi Cuenta
+IMAGE_CACHE_BYTES = 64 * 1024 * 1024  # Presupuesto de la caché de imágenes
+IMAGE_STAT_TTL = 5.0  # Segundos entre comprobaciones de la fecha de modificación
+THUMBNAIL_DIR = "thumbnails"
+# Tamaños de miniatura usados por la tabla, las tarjetas y el diálogo de detalles
+THUMBNAIL_SIZES = ((80, 80), (180, 150), (280, 180))
+COLUMNAR_CATALOG_THRESHOLD = 100_000  # A partir de cuántos productos se usa el catálogo columnar
+LOW_STOCK_THRESHOLD = 10
+STARTUP_WARM_THUMBNAILS = 24  # Miniaturas que se preparan durante el arranque
+IMPORT_TIME_BUDGET_MS = 300  # Tiempo máximo para importar la aplicación (--check-import-time)
+LOW_EFFECTS_THRESHOLD = 30  # Elementos con sombra en pantalla a partir de los que se quitan las sombras
+
+THEMES = {"Claro": THEME_LIGHT, "Oscuro": THEME_DARK}
+MONTH_NAMES = ("Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic")
+CATEGORY_LABELS = {"Ramen": "Ramen", "Drink": "Bebidas", "Other": "Otros"}
 
 # Variable global para el tema actual
 current_theme = THEME_LIGHT
 
-# Crear directorios necesarios
-os.makedirs("images", exist_ok=True)
-os.makedirs("icons", exist_ok=True)
+class Product:
+    """Registro de producto; se desempaqueta como (nombre, precio, imagen, categoría, stock)"""
+    __slots__ = ("name", "price", "image_path", "category", "stock")
+
+    def __init__(self, name, price, image_path, category, stock):
+        self.name = name
+        self.price = float(price)
+        self.image_path = image_path
+        self.category = sys.intern(category)
+        self.stock = int(stock)
+
+    def __iter__(self):
+        return iter((self.name, self.price, self.image_path, self.category, self.stock))
+
+    def __repr__(self):
+        return f"Product{tuple(self)!r}"
+
+    def to_list(self):
+        """Forma serializable en JSON"""
+        return [self.name, self.price, self.image_path, self.category, self.stock]
+
+def json_default(obj):
+    """Serializa los productos al guardar en JSON"""
+    if isinstance(obj, Product):
+        return obj.to_list()
+    raise TypeError(f"{type(obj).__name__} no es serializable")
+
+_numpy = None
+
+def get_numpy():
+    """Importa NumPy la primera vez que se necesita; None si no está instalado"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+_charting = None
+
+def get_charting():
+    """Importa matplotlib (sin pyplot) la primera vez que se dibuja un gráfico; devuelve (Figure, FigureCanvasAgg)"""
+    global _charting
+    if _charting is None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        _charting = (Figure, FigureCanvasAgg)
+    return _charting
+
+def peak_rss_bytes():
+    """Memoria residente máxima del proceso, o None si el sistema no la ofrece"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # Linux la da en KiB
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (ImportError, AttributeError, OSError):
+        pass
+    return None
+
+class StartupProfiler:
+    """Fases del arranque para --profile-startup: tiempo real, CPU del proceso y memoria máxima"""
+    def __init__(self, started, use_cprofile=False):
+        self.started = started  # (perf_counter, process_time) del inicio
+        self.use_cprofile = use_cprofile
+        self.phases = []
+        self.interactive_ms = None
+        self._depth = 0
+        self._profiles = {}  # índice de fase -> cProfile.Profile
+
+    def record(self, name, wall_start, cpu_start, depth=0):
+        """Añade una fase que empezó en (wall_start, cpu_start) y termina ahora; devuelve su índice"""
+        peak = peak_rss_bytes()
+        self.phases.append({
+            "name": name,
+            "depth": depth,
+            "start_ms": round((wall_start - self.started[0]) * 1000, 1),
+            "wall_ms": round((time.perf_counter() - wall_start) * 1000, 1),
+            "cpu_ms": round((time.process_time() - cpu_start) * 1000, 1),
+            "peak_rss_mb": None if peak is None else round(peak / (1024 * 1024), 1),
+        })
+        return len(self.phases) - 1
+
+    @contextmanager
+    def phase(self, name):
+        depth = self._depth
+        self._depth += 1
+        profile = None
+        if self.use_cprofile and depth == 0:
+            import cProfile
+            profile = cProfile.Profile()
+            profile.enable()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            self._depth -= 1
+            index = self.record(name, wall_start, cpu_start, depth)
+            if profile is not None:
+                self._profiles[index] = profile
+
+    def mark_interactive(self):
+        """Instante en que la ventana principal queda visible"""
+        self.interactive_ms = round((time.perf_counter() - self.started[0]) * 1000, 1)
+
+    def write(self, prefix):
+        """Escribe prefix.json y prefix.txt (y prefix.prof con cProfile de la fase más lenta)"""
+        phases = sorted(self.phases, key=lambda p: (p["start_ms"], p["depth"]))
+        top_level = [p for p in self.phases if p["depth"] == 0]
+        slowest = max(top_level, key=lambda p: p["wall_ms"], default=None)
+        peak = peak_rss_bytes()
+        report = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "interactive_ms": self.interactive_ms,
+            "total_ms": round((time.perf_counter() - self.started[0]) * 1000, 1),
+            "peak_rss_mb": None if peak is None else round(peak / (1024 * 1024), 1),
+            "slowest_phase": slowest["name"] if slowest else None,
+            "cprofile": None,
+            "phases": phases,
+        }
+        profile = self._profiles.get(self.phases.index(slowest)) if slowest else None
+        if profile is not None:
+            report["cprofile"] = prefix + ".prof"
+            profile.dump_stats(report["cprofile"])
+        atomic_write_json(prefix + ".json", report, indent=2)
+
+        lines = [f"Arranque de FoodWizz ({report['timestamp']}, Python {report['python']})",
+                 f"{'Fase':<44}{'Inicio':>10}{'Real':>10}{'CPU':>10}{'RSS máx':>11}"]
+        for p in phases:
+            rss = "n/d" if p["peak_rss_mb"] is None else f"{p['peak_rss_mb']:.1f} MB"
+            name = ("  " * p["depth"] + p["name"])[:43]
+            lines.append(f"{name:<44}{p['start_ms']:>8.1f}ms{p['wall_ms']:>8.1f}ms{p['cpu_ms']:>8.1f}ms{rss:>11}")
+        lines.append("")
+        lines.append(f"Ventana visible a los {report['interactive_ms']} ms; total medido {report['total_ms']} ms")
+        if slowest:
+            lines.append(f"Fase más lenta: {slowest['name']} ({slowest['wall_ms']} ms)")
+        if report["cprofile"]:
+            lines.append(f"Perfil cProfile de la fase más lenta: {report['cprofile']} (los tiempos incluyen su sobrecoste)")
+        with open(prefix + ".txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return report
+
+# Perfilador activo con --profile-startup; None en una ejecución normal
+startup_profiler = None
+
+def profile_phase(name):
+    """Mide una fase del arranque si se está perfilando"""
+    if startup_profiler is None:
+        return nullcontext()
+    return startup_profiler.phase(name)
+
+def profiled(name):
+    """Decorador: mide cada llamada como una fase del arranque si se está perfilando"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class ProductColumns:
+    """Catálogo columnar para catálogos grandes.
+
+    Nombres e imágenes van empaquetados en UTF-8 en un único búfer, las categorías
+    como códigos de un array y precio y stock en arrays numéricos. Se comporta como
+    una lista de Product: indexar, asignar, borrar, añadir e iterar.
+    """
+    def __init__(self, rows=()):
+        self._text = bytearray()
+        self._name_starts = array("Q")
+        self._name_lengths = array("I")
+        self._image_starts = array("Q")
+        self._image_lengths = array("I")
+        self._categories = []  # código -> categoría
+        self._category_codes = {}  # categoría -> código
+        self._garbage = 0  # bytes del búfer que ya no usa ninguna fila
+        self.category_codes = array("H")
+        self.prices = array("d")
+        self.stocks = array("q")
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def _index(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("índice de producto fuera de rango")
+        return index
+
+    def _pack(self, text):
+        data = text.encode("utf-8")
+        start = len(self._text)
+        self._text += data
+        return start, len(data)
+
+    def _category_code(self, category):
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self._categories)
+            self._categories.append(sys.intern(category))
+        return code
+
+    def name(self, index):
+        """Nombre de la fila sin construir el Product completo"""
+        index = self._index(index)
+        start = self._name_starts[index]
+        return self._text[start:start + self._name_lengths[index]].decode("utf-8")
+
+    def image_path(self, index):
+        index = self._index(index)
+        start = self._image_starts[index]
+        return self._text[start:start + self._image_lengths[index]].decode("utf-8")
+
+    def category(self, index):
+        return self._categories[self.category_codes[self._index(index)]]
+
+    def categories(self):
+        """Categorías internadas, en el orden de sus códigos"""
+        return list(self._categories)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = self._index(index)
+        return Product(self.name(index), self.prices[index], self.image_path(index),
+                       self._categories[self.category_codes[index]], self.stocks[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, product):
+        name, price, image_path, category, stock = product
+        start, length = self._pack(name)
+        self._name_starts.append(start)
+        self._name_lengths.append(length)
+        start, length = self._pack(image_path)
+        self._image_starts.append(start)
+        self._image_lengths.append(length)
+        self.category_codes.append(self._category_code(category))
+        self.prices.append(price)
+        self.stocks.append(stock)
+
+    def __setitem__(self, index, product):
+        index = self._index(index)
+        name, price, image_path, category, stock = product
+        self._garbage += self._name_lengths[index] + self._image_lengths[index]
+        self._name_starts[index], self._name_lengths[index] = self._pack(name)
+        self._image_starts[index], self._image_lengths[index] = self._pack(image_path)
+        self.category_codes[index] = self._category_code(category)
+        self.prices[index] = price
+        self.stocks[index] = stock
+        self._maybe_compact()
+
+    def __delitem__(self, index):
+        index = self._index(index)
+        self._garbage += self._name_lengths[index] + self._image_lengths[index]
+        for column in (self._name_starts, self._name_lengths, self._image_starts, self._image_lengths,
+                       self.category_codes, self.prices, self.stocks):
+            del column[index]
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        """Reescribe el búfer de textos cuando más de la mitad son restos de filas cambiadas"""
+        if self._garbage * 2 <= len(self._text):
+            return
+        text, self._text = self._text, bytearray()
+        for starts, lengths in ((self._name_starts, self._name_lengths),
+                                (self._image_starts, self._image_lengths)):
+            for i, (start, length) in enumerate(zip(starts, lengths)):
+                starts[i] = len(self._text)
+                self._text += text[start:start + length]
+        self._garbage = 0
+
+    def take(self, rows):
+        """Nuevo catálogo columnar con las filas indicadas, copiando columnas sin construir registros"""
+        result = ProductColumns()
+        result._categories = list(self._categories)
+        result._category_codes = dict(self._category_codes)
+        text = self._text
+        for starts, lengths, new_starts, new_lengths in (
+                (self._name_starts, self._name_lengths, result._name_starts, result._name_lengths),
+                (self._image_starts, self._image_lengths, result._image_starts, result._image_lengths)):
+            for row in rows:
+                start, length = starts[row], lengths[row]
+                new_starts.append(len(result._text))
+                new_lengths.append(length)
+                result._text += text[start:start + length]
+        for column, new_column in ((self.category_codes, result.category_codes),
+                                   (self.prices, result.prices), (self.stocks, result.stocks)):
+            new_column.extend(column[row] for row in rows)
+        return result
+
+    def column(self, name):
+        """Columna "price", "stock" o "category" como vista NumPy sin copia (o el array si no hay NumPy).
+
+        La vista bloquea el redimensionado del array: no debe conservarse más allá del cálculo.
+        """
+        data = {"price": self.prices, "stock": self.stocks, "category": self.category_codes}[name]
+        numpy = get_numpy()
+        return numpy.frombuffer(data, dtype=data.typecode) if numpy else data
+
+    def nbytes(self):
+        """Memoria ocupada por las columnas"""
+        return len(self._text) + sum(c.itemsize * len(c) for c in (
+            self._name_starts, self._name_lengths, self._image_starts, self._image_lengths,
+            self.category_codes, self.prices, self.stocks))
+
+def make_catalog(rows):
+    """Catálogo de Product; columnar si supera COLUMNAR_CATALOG_THRESHOLD productos"""
+    if not isinstance(rows, (list, tuple)):
+        rows = list(rows)
+    if len(rows) > COLUMNAR_CATALOG_THRESHOLD:
+        return ProductColumns(rows)
+    return [Product(*row) for row in rows]
+
+def catalog_stats(catalog, low_stock_threshold=LOW_STOCK_THRESHOLD):
+    """Totales del catálogo: productos, valor del inventario, stock bajo y precio medio"""
+    total = len(catalog)
+    if isinstance(catalog, ProductColumns):
+        prices, stocks = catalog.column("price"), catalog.column("stock")
+        if get_numpy():
+            value = float(prices @ stocks) if total else 0.0
+            low_stock = int((stocks < low_stock_threshold).sum())
+            price_sum = float(prices.sum())
+        else:
+            value = sum(price * stock for price, stock in zip(prices, stocks))
+            low_stock = sum(1 for s in stocks if s < low_stock_threshold)
+            price_sum = sum(prices)
+        del prices, stocks
+    else:
+        value = sum(p.price * p.stock for p in catalog)
+        low_stock = sum(1 for p in catalog if p.stock < low_stock_threshold)
+        price_sum = sum(p.price for p in catalog)
+    return {
+        "total_products": total,
+        "total_value": value,
+        "low_stock": low_stock,
+        "avg_price": price_sum / total if total else 0,
+    }
+
+class CatalogKPIs:
+    """Totales de catalog_stats mantenidos con sumas y contadores; cada cambio cuesta O(1)"""
+    def __init__(self, low_stock_threshold=LOW_STOCK_THRESHOLD):
+        self.low_stock_threshold = low_stock_threshold
+        self.count = 0
+        self.value = 0.0  # Suma de precio * stock
+        self.low_stock = 0
+        self.price_sum = 0.0
+
+    def load(self, catalog):
+        """Parte de una pasada completa (vectorizada en el catálogo columnar)"""
+        stats = catalog_stats(catalog, self.low_stock_threshold)
+        self.count = stats["total_products"]
+        self.value = float(stats["total_value"])
+        self.low_stock = stats["low_stock"]
+        self.price_sum = stats["avg_price"] * self.count
+
+    def add(self, product):
+        self.count += 1
+        self.value += product.price * product.stock
+        self.low_stock += product.stock < self.low_stock_threshold
+        self.price_sum += product.price
+
+    def remove(self, product):
+        self.count -= 1
+        if not self.count:
+            # Sin productos se descarta el error de redondeo acumulado
+            self.value = self.price_sum = 0.0
+            self.low_stock = 0
+            return
+        self.value -= product.price * product.stock
+        self.low_stock -= product.stock < self.low_stock_threshold
+        self.price_sum -= product.price
+
+    def replace(self, original, product):
+        self.remove(original)
+        self.add(product)
+
+    def stats(self):
+        """Mismo formato que catalog_stats"""
+        return {
+            "total_products": self.count,
+            "total_value": self.value,
+            "low_stock": self.low_stock,
+            "avg_price": self.price_sum / self.count if self.count else 0,
+        }
 
 def load_products():
     """Carga los productos desde un archivo JSON o usa datos predeterminados"""
     if os.path.exists(DATA_FILE):
         try:
             with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return [tuple(p) for p in data]
+                return make_catalog(json.load(f))
         except Exception as e:
             print(f"Error cargando productos: {e}")
     
     # Datos de ejemplo
-    return [
+    return make_catalog([
         ("Beef Ramen", 23.00, "img/beef_ramen.jpg", "Ramen", 12),
         ("Chicken Teriyaki", 18.50, "img/chicken_teriyaki.jpg", "Ramen", 8),
         ("Sushi Roll", 12.00, "img/sushi_roll.jpg", "Other", 20),
@@ -129,7 +587,7 @@ def load_products():
         ("Coconut Water", 4.75, "img/coconut_water.jpg", "Drink", 20),
         ("Seaweed Salad", 9.00, "img/seaweed_salad.jpg", "Other", 2),
         ("Oolong Tea", 4.00, "img/oolong_tea.jpg", "Drink", 22),
-    ]
+    ])
 
 def load_user_data():
     """Carga los datos del usuario"""
@@ -159,50 +617,1963 @@ def load_user_data():
             pass
     return default_data
 
-def save_user_data(data):
-    """Guarda los datos del usuario"""
+def atomic_write_json(path, data, indent=None):
+    """Escribe JSON en un temporal, lo sincroniza a disco y lo renombra sobre path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
     try:
-        with open(USER_DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Error guardando datos de usuario: {e}")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent, default=json_default)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class PersistenceWorker(QThread):
+    """Hilo de guardado: agrupa los guardados seguidos de un archivo en una sola escritura atómica"""
+    save_failed = pyqtSignal(str, str)
+
+    def __init__(self, delay=SAVE_COALESCE_DELAY, parent=None):
+        super().__init__(parent)
+        self.delay = delay
+        self._pending = {}  # ruta -> (datos, sangría)
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()  # Un lote tomado se escribe antes que el siguiente
+        self._stopping = False
+
+    def schedule(self, path, data, indent=2):
+        """Encola el contenido de path; sólo se escribe la última versión pedida"""
+        with self._condition:
+            self._pending[path] = (data, indent)
+            self._condition.notify()
+        if not self.isRunning():
+            self.start()
+
+    def report_failure(self, path, error):
+        """Notifica a la interfaz un error de guardado ocurrido fuera del hilo"""
+        self.save_failed.emit(path, str(error))
+
+    def flush(self):
+        """Escribe ya lo pendiente desde el hilo que llama y espera a la escritura en curso"""
+        with self._write_lock:
+            self._write(self._take_pending())
+
+    def stop(self):
+        """Escribe lo pendiente y termina el hilo"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self.isRunning():
+            self.wait()
+        else:
+            self.flush()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                # Ventana de agrupación: los guardados que lleguen ahora sustituyen a los encolados
+                if not self._stopping:
+                    self._condition.wait(self.delay)
+            self.flush()
+
+    def _take_pending(self):
+        with self._condition:
+            batch, self._pending = self._pending, {}
+        return batch
+
+    def _write(self, batch):
+        for path, (data, indent) in batch.items():
+            try:
+                atomic_write_json(path, data, indent=indent)
+            except Exception as e:
+                self.report_failure(path, e)
+
+# Escrituras de productos y datos de usuario fuera del hilo de la interfaz
+persistence_worker = PersistenceWorker()
+
+def save_user_data(data):
+    """Guarda los datos del usuario en segundo plano"""
+    persistence_worker.schedule(USER_DATA_FILE, dict(data))
 
 def save_products(products_list):
-    """Guarda los productos en un archivo JSON"""
+    """Guarda los productos en un archivo JSON en segundo plano"""
+    persistence_worker.schedule(DATA_FILE, list(products_list))
+
+class JsonProductStore:
+    """Catálogo en productos.json: cada cambio reescribe el archivo completo"""
+    def load(self):
+        return load_products()
+
+    def sync(self):
+        """Espera a que lo guardado en segundo plano esté en disco"""
+        persistence_worker.flush()
+
+    def import_catalog(self, catalog):
+        """Reemplaza el contenido guardado por catalog (al cambiar de almacenamiento)"""
+        atomic_write_json(DATA_FILE, list(catalog), indent=2)
+
+    def activate(self):
+        """Empieza a usarse, una vez cerrado el almacenamiento anterior.
+
+        La instantánea recién escrita ya incluye todo: un diario de una etapa anterior
+        con el diario de cambios no debe volver a aplicarse sobre ella.
+        """
+        for journal_path in (JOURNAL_FILE, JOURNAL_FILE + ".old"):
+            try:
+                os.remove(journal_path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        pass
+
+    def add(self, catalog, product):
+        save_products(catalog)
+
+    def update(self, catalog, original_name, product):
+        save_products(catalog)
+
+    def remove(self, catalog, name):
+        save_products(catalog)
+
+def replay_journal(catalog, records):
+    """Aplica registros del diario al catálogo y lo devuelve; repetir un registro no cambia el resultado.
+
+    Un índice nombre -> fila hace la reproducción O(registros + productos). Las filas
+    borradas se retiran al final para que las posiciones del índice sigan valiendo.
+    """
+    name_at = catalog.name if isinstance(catalog, ProductColumns) else (lambda row: catalog[row].name)
+    rows = {name_at(row).casefold(): row for row in range(len(catalog))}
+    removed = set()
+
+    def put(product):
+        row = rows.get(product.name.casefold())
+        if row is None:
+            rows[product.name.casefold()] = len(catalog)
+            catalog.append(product)
+        else:
+            catalog[row] = product
+
+    for record in records:
+        op = record[0]
+        if op == "add":
+            put(Product(*record[1]))
+        elif op == "update":
+            product = Product(*record[2])
+            row = rows.pop(record[1].casefold(), None)
+            target = rows.get(product.name.casefold())
+            if target is not None:
+                # Ya hay una fila con el nombre nuevo: es este mismo cambio, recogido en la
+                # instantánea antes de borrar el diario. Se reemplaza y la fila de origen sobra
+                catalog[target] = product
+                if row is not None:
+                    removed.add(row)
+            elif row is None:
+                put(product)
+            else:
+                catalog[row] = product
+                rows[product.name.casefold()] = row
+        elif op == "remove":
+            row = rows.pop(record[1].casefold(), None)
+            if row is not None:
+                removed.add(row)
+
+    if not removed:
+        return catalog
+    live_rows = [row for row in range(len(catalog)) if row not in removed]
+    if isinstance(catalog, ProductColumns):
+        return catalog.take(live_rows)
+    return [catalog[row] for row in live_rows]
+
+class JournalProductStore(JsonProductStore):
+    """Catálogo en productos.json más un diario de cambios que se compacta en segundo plano"""
+    def __init__(self, path=DATA_FILE, journal_path=JOURNAL_FILE, compact_bytes=JOURNAL_COMPACT_BYTES):
+        self.path = path
+        self.journal_path = journal_path
+        self.old_journal_path = journal_path + ".old"
+        self.compact_bytes = compact_bytes
+        self._journal = None
+        self._compaction = None
+
+    def load(self):
+        records = [record for journal_path in (self.old_journal_path, self.journal_path)
+                   for record in self._read_journal(journal_path)]
+        catalog = replay_journal(load_products(), records)
+
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if os.path.exists(self.old_journal_path):
+            # Una compactación anterior no terminó: se completa ahora
+            self._rotate_journal()
+            self._compact(list(catalog))
+        elif self._journal.tell() > self.compact_bytes:
+            self._start_compaction(catalog)
+        return catalog
+
+    def _read_journal(self, journal_path):
+        """Registros válidos del diario; una última línea incompleta se recorta del archivo"""
+        if not os.path.exists(journal_path):
+            return []
+        records, valid_bytes = [], 0
+        with open(journal_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("registro sin terminar")
+                    records.append(json.loads(line.decode("utf-8")))
+                except ValueError:
+                    print(f"Registro incompleto descartado en {journal_path}")
+                    break
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(journal_path):
+            with open(journal_path, "r+b") as f:
+                f.truncate(valid_bytes)
+        return records
+
+    def _append(self, catalog, record):
+        try:
+            self._journal.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        except OSError as e:
+            persistence_worker.report_failure(self.journal_path, e)
+            return
+        if self._journal.tell() > self.compact_bytes:
+            self._start_compaction(catalog)
+
+    def sync(self):
+        """Espera a la compactación en curso y a los guardados en segundo plano"""
+        if self._compaction is not None:
+            self._compaction.join()
+        super().sync()
+
+    def activate(self):
+        super().activate()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def add(self, catalog, product):
+        self._append(catalog, ["add", list(product)])
+
+    def update(self, catalog, original_name, product):
+        self._append(catalog, ["update", original_name, list(product)])
+
+    def remove(self, catalog, name):
+        self._append(catalog, ["remove", name])
+
+    def _rotate_journal(self):
+        """Aparta el diario actual para compactarlo; los cambios nuevos van a uno vacío"""
+        self._journal.close()
+        if os.path.exists(self.old_journal_path):
+            with open(self.old_journal_path, "a", encoding="utf-8") as dst, \
+                    open(self.journal_path, "r", encoding="utf-8") as src:
+                dst.write(src.read())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.old_journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _start_compaction(self, catalog):
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._rotate_journal()
+        self._compaction = threading.Thread(target=self._compact, args=(list(catalog),), daemon=True)
+        self._compaction.start()
+
+    def _compact(self, snapshot):
+        """Escribe la instantánea completa y descarta el diario ya incluido en ella"""
+        try:
+            atomic_write_json(self.path, snapshot, indent=2)
+            os.remove(self.old_journal_path)
+        except OSError as e:
+            print(f"Error compactando el diario de productos: {e}")
+
+class SQLiteProductStore:
+    """Catálogo en SQLite (modo WAL) con cambios de una sola fila"""
+    SCHEMA_VERSION = 2
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        # Se abre en el hilo de arranque y se usa después desde la interfaz, nunca a la vez
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS products (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    image_path TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    stock INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_products_name ON products(name COLLATE NOCASE);
+            """)
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            # Las búsquedas las resuelve SearchIndex: la versión 1 mantenía además un
+            # índice FTS5 por trigramas y un índice por categoría que nadie consultaba
+            if version == 1:
+                self.conn.executescript("""
+                    DROP TRIGGER IF EXISTS products_ai;
+                    DROP TRIGGER IF EXISTS products_ad;
+                    DROP TRIGGER IF EXISTS products_au;
+                    DROP TABLE IF EXISTS products_fts;
+                    DROP INDEX IF EXISTS idx_products_category;
+                """)
+
+            # Importación única del catálogo JSON existente
+            if version == 0 and not self.conn.execute("SELECT 1 FROM products LIMIT 1").fetchone():
+                self.conn.executemany(
+                    "INSERT INTO products (name, price, image_path, category, stock) VALUES (?, ?, ?, ?, ?)",
+                    map(tuple, load_products()))
+            if version < self.SCHEMA_VERSION:
+                self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def load(self):
+        rows = self.conn.execute(
+            "SELECT name, price, image_path, category, stock FROM products ORDER BY id")
+        return make_catalog(rows)
+
+    def sync(self):
+        pass  # Cada cambio ya está confirmado en la base de datos
+
+    def import_catalog(self, catalog):
+        """Reemplaza la tabla de productos por catalog en una sola transacción"""
+        with self.conn:
+            self.conn.execute("DELETE FROM products")
+            self.conn.executemany(
+                "INSERT INTO products (name, price, image_path, category, stock) VALUES (?, ?, ?, ?, ?)",
+                map(tuple, catalog))
+
+    def activate(self):
+        pass
+
+    def close(self):
+        self.conn.close()
+
+    def _write(self, sql, params):
+        try:
+            with self.conn:
+                self.conn.execute(sql, params)
+        except sqlite3.Error as e:
+            persistence_worker.report_failure(self.path, e)
+
+    def add(self, catalog, product):
+        self._write("INSERT INTO products (name, price, image_path, category, stock) VALUES (?, ?, ?, ?, ?)",
+                    tuple(product))
+
+    def update(self, catalog, original_name, product):
+        self._write("UPDATE products SET name = ?, price = ?, image_path = ?, category = ?, stock = ? "
+                    "WHERE name = ? COLLATE NOCASE", (*product, original_name))
+
+    def remove(self, catalog, name):
+        self._write("DELETE FROM products WHERE name = ? COLLATE NOCASE", (name,))
+
+PRODUCT_STORES = {"json": JsonProductStore, "journal": JournalProductStore, "sqlite": SQLiteProductStore}
+
+def create_product_store(backend):
+    """Crea el almacenamiento de productos configurado ("json", "journal" o "sqlite")"""
+    if backend == "sqlite":
+        try:
+            return SQLiteProductStore()
+        except sqlite3.Error as e:
+            print(f"Error abriendo la base de datos, se usa JSON: {e}")
+            return JsonProductStore()
+    return PRODUCT_STORES.get(backend, JsonProductStore)()
+
+def switch_product_store(backend):
+    """Pasa el catálogo actual al almacenamiento backend y lo usa desde ya.
+
+    Cada almacenamiento guarda sus datos por separado, así que sin esta copia el
+    nuevo arrancaría con un catálogo desfasado. Lanza OSError o sqlite3.Error si la
+    copia falla; en ese caso se sigue usando el almacenamiento anterior.
+    """
+    global product_store
+    old_store = product_store
+    old_store.sync()
+    new_store = PRODUCT_STORES[backend]()
     try:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(products_list, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        QMessageBox.critical(None, "Error al Guardar", f"No se pudo guardar los datos: {e}")
-
-# Cargar datos iniciales
-products = load_products()
-user_data = load_user_data()
-
-class ModernShadowEffect(QGraphicsDropShadowEffect):
-    """Efecto de sombra"""
-    def __init__(self, parent=None, blur_radius=20, offset=QPoint(0, 8), color=None):
+        new_store.import_catalog(product_repository.catalog())
+    except BaseException:
+        new_store.close()
+        raise
+    old_store.close()
+    new_store.activate()
+    product_store = product_repository.store = new_store
+
+class CatalogEvents(QObject):
+    """Bus de cambios del catálogo: una señal por tipo de cambio con el ID afectado.
+
+    version aumenta con cada cambio; una vista que guarda la versión que ya
+    muestra sabe si tiene que refrescarse.
+    """
+    product_added = pyqtSignal(int)
+    product_updated = pyqtSignal(int)
+    product_removed = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.version = 0
+
+    def publish(self, signal, product_id):
+        self.version += 1
+        signal.emit(product_id)
+
+class ProductRepository:
+    """Dueño del catálogo: IDs estables, índices hash por ID y por nombre sin mayúsculas
+    y los totales del catálogo (kpis) al día con cada cambio.
+
+    Borrar deja una lápida en la fila en vez de desplazar las siguientes; las lápidas
+    se compactan cuando superan COMPACT_RATIO de las filas.
+    """
+    COMPACT_RATIO = 0.25
+
+    def __init__(self, store, catalog, index=None, events=None):
+        self.store = store
+        self.index = index
+        self.events = events
+        self._rows = catalog  # list de Product o ProductColumns
+        self._ids = array("q")  # ID de cada fila; 0 en las lápidas
+        self._row_by_id = {}
+        self._id_by_name = {}
+        self._image_refs = {}  # ruta de imagen -> productos que la usan
+        self._next_id = 1
+        self._dead = 0
+        for row in range(len(catalog)):
+            product = catalog[row]
+            product_id = self._next_id
+            self._next_id += 1
+            self._ids.append(product_id)
+            self._row_by_id[product_id] = row
+            self._link(product_id, product)
+            if index is not None:
+                index.add(product, product_id)
+        self.kpis = CatalogKPIs()
+        self.kpis.load(catalog)
+
+    def _link(self, product_id, product):
+        self._id_by_name[product.name.casefold()] = product_id
+        self._image_refs[product.image_path] = self._image_refs.get(product.image_path, 0) + 1
+
+    def _unlink(self, product):
+        self._id_by_name.pop(product.name.casefold(), None)
+        refs = self._image_refs.get(product.image_path, 0) - 1
+        if refs > 0:
+            self._image_refs[product.image_path] = refs
+        else:
+            self._image_refs.pop(product.image_path, None)
+
+    def __len__(self):
+        return len(self._row_by_id)
+
+    def __iter__(self):
+        for _, product in self.items():
+            yield product
+
+    def items(self):
+        """Pares (ID, producto) en el orden del catálogo"""
+        for row, product_id in enumerate(self._ids):
+            if product_id:
+                yield product_id, self._rows[row]
+
+    def ids(self):
+        return [product_id for product_id in self._ids if product_id]
+
+    def names(self):
+        """Pares (ID, nombre) sin construir registros en el catálogo columnar"""
+        if isinstance(self._rows, ProductColumns):
+            name_at = self._rows.name
+        else:
+            name_at = lambda row: self._rows[row].name
+        for row, product_id in enumerate(self._ids):
+            if product_id:
+                yield product_id, name_at(row)
+
+    def get(self, product_id):
+        row = self._row_by_id.get(product_id)
+        return None if row is None else self._rows[row]
+
+    def row_ids(self):
+        """Copia en array("q") del ID de cada fila de catalog()"""
+        self.catalog()
+        return array("q", self._ids)
+
+    def find(self, name):
+        """ID del producto con ese nombre, sin distinguir mayúsculas, o None"""
+        return self._id_by_name.get(name.casefold())
+
+    def image_in_use(self, image_path):
+        return image_path in self._image_refs
+
+    def image_paths(self):
+        return set(self._image_refs)
+
+    def catalog(self):
+        """Filas vivas (list o ProductColumns) para cálculos sobre todo el catálogo; no modificar"""
+        if self._dead:
+            self.compact()
+        return self._rows
+
+    def upsert(self, product, product_id=None):
+        """Inserta o reemplaza un producto, lo guarda y devuelve su ID.
+
+        Sin product_id se reemplaza el producto del mismo nombre si existe. Lanza
+        ValueError si el nombre ya pertenece a otro producto.
+        """
+        if product_id is not None and product_id not in self._row_by_id:
+            raise KeyError(product_id)
+        owner = self.find(product.name)
+        if product_id is None:
+            product_id = owner
+        elif owner is not None and owner != product_id:
+            raise ValueError(f"Ya existe un producto llamado '{product.name}'")
+
+        if product_id is None:
+            product_id = self._next_id
+            self._next_id += 1
+            self._row_by_id[product_id] = len(self._ids)
+            self._ids.append(product_id)
+            self._rows.append(product)
+            self._link(product_id, product)
+            self.kpis.add(product)
+            self.store.add(self, product)
+            if self.index is not None:
+                self.index.add(product, product_id)
+            if self.events is not None:
+                self.events.publish(self.events.product_added, product_id)
+        else:
+            row = self._row_by_id[product_id]
+            original = self._rows[row]
+            self._unlink(original)
+            self._rows[row] = product
+            self._link(product_id, product)
+            self.kpis.replace(original, product)
+            self.store.update(self, original.name, product)
+            if self.index is not None:
+                self.index.update(product_id, product)
+            if self.events is not None:
+                self.events.publish(self.events.product_updated, product_id)
+        return product_id
+
+    def delete(self, product_id):
+        """Borra un producto y lo devuelve; None si no existe"""
+        row = self._row_by_id.pop(product_id, None)
+        if row is None:
+            return None
+        product = self._rows[row]
+        self._unlink(product)
+        self.kpis.remove(product)
+        self._ids[row] = 0
+        if isinstance(self._rows, list):
+            self._rows[row] = None
+        self._dead += 1
+        self.store.remove(self, product.name)
+        if self.index is not None:
+            self.index.remove(product_id)
+        if self._dead > self.COMPACT_RATIO * len(self._ids):
+            self.compact()
+        if self.events is not None:
+            self.events.publish(self.events.product_removed, product_id)
+        return product
+
+    def compact(self):
+        """Elimina las lápidas; los IDs no cambian"""
+        live_rows = [row for row, product_id in enumerate(self._ids) if product_id]
+        if isinstance(self._rows, ProductColumns):
+            self._rows = self._rows.take(live_rows)
+        else:
+            self._rows = [self._rows[row] for row in live_rows]
+        self._ids = array("q", (self._ids[row] for row in live_rows))
+        self._row_by_id = {product_id: row for row, product_id in enumerate(self._ids)}
+        self._dead = 0
+
+class OrderLedger(QObject):
+    """Libro de ventas con totales por día, mes y categoría que se actualizan con cada venta.
+
+    Cada línea vendida se añade a SALES_LEDGER_FILE como [fecha, orden, ID, nombre,
+    categoría, cantidad, precio]. Los totales se guardan en SALES_ROLLUP_FILE junto
+    con los bytes del libro que ya incluyen, cada SALES_ROLLUP_EVERY líneas y al
+    salir; al arrancar sólo se leen las líneas posteriores, así que los informes no
+    recorren el libro completo.
+
+    Los totales por producto van por ID del repositorio y siguen al producto si se
+    renombra. Los IDs sólo valen durante la sesión: en disco los totales usan el
+    nombre, el libro anota ["rename", anterior, nuevo] al renombrar un producto con
+    ventas y al arrancar los nombres se resuelven a IDs.
+    """
+    changed = pyqtSignal()
+
+    def __init__(self, path=SALES_LEDGER_FILE, rollup_path=SALES_ROLLUP_FILE, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.rollup_path = rollup_path
+        self.version = 0
+        self.repository = None
+        self._file = None
+        self._reset()
+
+    def _reset(self):
+        self.lines = 0
+        self.orders = 0  # ID de la última orden
+        self.by_day = {}  # "AAAA-MM-DD" -> [importe, unidades]
+        self.by_month = {}  # "AAAA-MM" -> [importe, unidades]
+        self.by_category = {}  # categoría -> [importe, unidades]
+        # ID -> [importe, unidades, "AAAA-MM-DD" de la última venta, nombre]; por nombre mientras se carga
+        self.by_product = {}
+        # Copia de by_product en columnas por ID para la analítica; día ordinal, 0 si nunca se vendió
+        self._revenue_by_id = array("d")
+        self._units_by_id = array("q")
+        self._last_sale_by_id = array("q")
+        self._offset = 0  # Bytes del libro incluidos en los totales
+        self._saved_lines = 0  # Líneas incluidas en el último guardado de los totales
+        self._saved_offset = 0  # Bytes del libro incluidos en el último guardado, con los cambios de nombre
+
+    def load(self, repository, report=None):
+        """Carga los totales guardados y aplica las líneas del libro que aún no incluyen"""
+        self.repository = repository
+        if repository.events is not None:
+            repository.events.product_updated.connect(self._on_product_updated)
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if not self._load_rollups():
+            self._reset()
+        elif self._offset > size:
+            print(f"{self.rollup_path} no corresponde a {self.path}; se recalcula desde el libro")
+            self._reset()
+        replayed = self._replay(size, report)
+        by_name, self.by_product = self.by_product, {}
+        for name, totals in by_name.items():
+            product_id = repository.find(name)
+            if product_id is not None:  # Las ventas de productos ya borrados no tienen fila
+                self.by_product[product_id] = totals
+                self._track(product_id)
+        self._file = open(self.path, "a", encoding="utf-8")
+        if replayed:
+            self._save_rollups()
+
+    def _load_rollups(self):
+        try:
+            with open(self.rollup_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._offset = int(data["offset"])
+            self.lines = int(data["lines"])
+            self.orders = int(data["orders"])
+            self.by_day = data["days"]
+            self.by_month = data["months"]
+            self.by_category = data["categories"]
+            self.by_product = {name: totals + [name] for name, totals in data["products"].items()}
+            self._saved_lines = self.lines
+            self._saved_offset = self._offset
+            return True
+        except FileNotFoundError:
+            return False
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Error leyendo {self.rollup_path}: {e}")
+            return False
+
+    def _replay(self, size, report=None):
+        """Aplica las líneas desde _offset; una última línea incompleta se recorta del archivo"""
+        if self._offset >= size:
+            return 0
+        replayed, valid_bytes = 0, self._offset
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for raw_line in f:
+                try:
+                    if not raw_line.endswith(b"\n"):
+                        raise ValueError("línea sin terminar")
+                    line = json.loads(raw_line.decode("utf-8"))
+                    if line[0] == "rename":
+                        self._rename(line[1], line[2])
+                    else:
+                        if len(line) == 6:  # Formato anterior, sin ID
+                            line.insert(2, None)
+                        line[2] = line[3]  # El ID es de la sesión que escribió la línea
+                        self._apply(line)
+                except ValueError:
+                    print(f"Línea de venta incompleta descartada en {self.path}")
+                    break
+                valid_bytes += len(raw_line)
+                replayed += 1
+                if report is not None and replayed % 10000 == 0:
+                    report(valid_bytes / size)
+        if valid_bytes < size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_bytes)
+        self._offset = valid_bytes
+        return replayed
+
+    def _apply(self, line):
+        timestamp, order_id, product_id, name, category, quantity, price = line
+        amount = quantity * price
+        day = timestamp[:10]
+        for table, key in ((self.by_day, day), (self.by_month, day[:7]), (self.by_category, category)):
+            totals = table.get(key)
+            if totals is None:
+                table[key] = [amount, quantity]
+            else:
+                totals[0] += amount
+                totals[1] += quantity
+        totals = self.by_product.get(product_id)
+        if totals is None:
+            self.by_product[product_id] = [amount, quantity, day, name]
+        else:
+            totals[0] += amount
+            totals[1] += quantity
+            totals[2] = max(totals[2], day)
+        self.lines += 1
+        self.orders = max(self.orders, order_id)
+
+    def record(self, items):
+        """Registra una orden de tríos (ID, producto, cantidad); devuelve su ID o None si no se pudo guardar"""
+        order_id = self.orders + 1
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        lines = [[timestamp, order_id, product_id, product.name, product.category, quantity, product.price]
+                 for product_id, product, quantity in items]
+        if not self._write(lines):
+            return None
+        for line in lines:
+            self._apply(line)
+            self._track(line[2])
+        if self.lines - self._saved_lines >= SALES_ROLLUP_EVERY:
+            self._save_rollups()
+        self.version += 1
+        self.changed.emit()
+        return order_id
+
+    def _track(self, product_id):
+        """Copia los totales del producto a las columnas por ID"""
+        amount, quantity, last_day, _ = self.by_product[product_id]
+        missing = product_id + 1 - len(self._units_by_id)
+        if missing > 0:
+            self._revenue_by_id.extend(itertools.repeat(0.0, missing))
+            self._units_by_id.extend(itertools.repeat(0, missing))
+            self._last_sale_by_id.extend(itertools.repeat(0, missing))
+        self._revenue_by_id[product_id] = amount
+        self._units_by_id[product_id] = quantity
+        self._last_sale_by_id[product_id] = date.fromisoformat(last_day).toordinal()
+
+    def product_sales(self, product_ids):
+        """(ingresos, unidades, día ordinal de la última venta o 0) de cada ID, como arrays NumPy nuevos"""
+        numpy = get_numpy()
+        known = product_ids < len(self._units_by_id)
+        known_ids = product_ids[known]
+        columns = []
+        for values, dtype in ((self._revenue_by_id, numpy.float64), (self._units_by_id, numpy.int64),
+                              (self._last_sale_by_id, numpy.int64)):
+            column = numpy.zeros(len(product_ids), dtype=dtype)
+            if len(values):
+                # La vista del array se suelta al salir: si no, el array no podría crecer
+                column[known] = numpy.frombuffer(values, dtype=dtype)[known_ids]
+            columns.append(column)
+        return tuple(columns)
+
+    def _write(self, lines):
+        """Añade las líneas al libro y las lleva a disco; si falla, recorta lo escrito a medias"""
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n"
+                                     for line in lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            self._discard_partial_write()
+            persistence_worker.report_failure(self.path, e)
+            return False
+        self._offset = self._file.tell()
+        return True
+
+    def _discard_partial_write(self):
+        if self._file is not None:
+            try:
+                self._file.close()  # Cierra aunque no pueda vaciar el búfer
+            except OSError:
+                pass
+            self._file = None  # Se reabre en la siguiente escritura
+        try:
+            os.truncate(self.path, self._offset)
+        except OSError as e:
+            print(f"Error recortando {self.path}: {e}")
+
+    def _rename(self, old_name, new_name):
+        totals = self.by_product.pop(old_name, None)
+        if totals is not None:
+            totals[3] = new_name
+            self.by_product[new_name] = totals
+
+    def _on_product_updated(self, product_id):
+        totals = self.by_product.get(product_id)
+        if totals is None:
+            return
+        name = self.repository.get(product_id).name
+        if totals[3] != name:
+            # Las líneas anteriores llevan el nombre viejo: al arrancar se resuelven con esta
+            self._write([["rename", totals[3], name]])
+            totals[3] = name
+
+    def close(self):
+        """Guarda los totales pendientes; se llama al salir, antes de parar el hilo de guardado"""
+        if self._offset != self._saved_offset:
+            self._save_rollups()
+
+    def _save_rollups(self):
+        self._saved_lines = self.lines
+        self._saved_offset = self._offset
+        # Copia de las tablas: el hilo de guardado las serializa más tarde
+        persistence_worker.schedule(self.rollup_path, {
+            "offset": self._offset,
+            "lines": self.lines,
+            "orders": self.orders,
+            "days": {key: list(totals) for key, totals in self.by_day.items()},
+            "months": {key: list(totals) for key, totals in self.by_month.items()},
+            "categories": {key: list(totals) for key, totals in self.by_category.items()},
+            "products": {name: [amount, quantity, last_day]
+                         for amount, quantity, last_day, name in self.by_product.values()},
+        }, indent=None)
+
+    def monthly_revenue(self, months=REPORT_MONTHS, today=None):
+        """Pares (mes "AAAA-MM", importe) de los últimos meses hasta el actual, en orden"""
+        today = today or datetime.now()
+        year, month = today.year, today.month
+        keys = []
+        for _ in range(months):
+            keys.append(f"{year:04d}-{month:02d}")
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        return [(key, self.by_month.get(key, (0, 0))[0]) for key in reversed(keys)]
+
+    def category_revenue(self):
+        """Pares (categoría, importe) de mayor a menor"""
+        return sorted(((category, totals[0]) for category, totals in self.by_category.items()),
+                      key=lambda item: item[1], reverse=True)
+
+# Analítica del inventario: cálculos vectorizados con NumPy sobre columnas de
+# precio, stock, categoría y ventas, una posición por fila del catálogo
+
+def inventory_columns(catalog):
+    """(precios, stocks, códigos de categoría, categorías) del catálogo como arrays NumPy"""
+    numpy = get_numpy()
+    if isinstance(catalog, ProductColumns):
+        return (catalog.column("price"), catalog.column("stock"),
+                catalog.column("category"), catalog.categories())
+    count = len(catalog)
+    codes = {}
+    prices = numpy.fromiter((p.price for p in catalog), dtype=numpy.float64, count=count)
+    stocks = numpy.fromiter((p.stock for p in catalog), dtype=numpy.int64, count=count)
+    category_codes = numpy.fromiter((codes.setdefault(p.category, len(codes)) for p in catalog),
+                                    dtype=numpy.uint16, count=count)
+    return prices, stocks, category_codes, list(codes)
+
+def sales_columns(ledger, product_ids, today=None):
+    """(ingresos, unidades, días sin vender) de cada ID de product_ids y días observados.
+
+    Los productos sin ventas cuentan como sin vender desde el primer día del libro.
+    """
+    numpy = get_numpy()
+    today = (today or date.today()).toordinal()
+    observed = today - date.fromisoformat(min(ledger.by_day)).toordinal() + 1 if ledger.by_day else 0
+    revenue, units, last_sale = ledger.product_sales(product_ids)
+    idle_days = numpy.where(last_sale > 0, today - last_sale, observed)
+    return revenue, units, idle_days, max(observed, 1)
+
+def inventory_valuation(prices, stocks, category_codes, category_count):
+    """Valor del inventario (precio * stock) de cada código de categoría"""
+    return get_numpy().bincount(category_codes, weights=prices * stocks, minlength=category_count)
+
+def abc_classes(revenue, shares=ABC_SHARES):
+    """Clase de Pareto de cada producto: 0 = A, 1 = B, 2 = C.
+
+    Ordenados por ingresos, son A los que empiezan antes de shares[0] del total
+    acumulado y B los que empiezan antes de shares[1]; los que no venden son C.
+    """
+    numpy = get_numpy()
+    classes = numpy.full(len(revenue), 2, dtype=numpy.uint8)
+    total = revenue.sum()
+    if total <= 0:
+        return classes
+    ordered = numpy.sort(revenue)[::-1]
+    before = (numpy.cumsum(ordered) - ordered) / total
+    # Ingreso mínimo de cada clase; los empates en el corte quedan en la clase superior
+    for cls in (1, 0):
+        count = int(numpy.searchsorted(before, shares[cls], side="left"))
+        if count:
+            classes[revenue >= ordered[count - 1]] = cls
+    classes[revenue <= 0] = 2
+    return classes
+
+def days_of_cover(stocks, units, observed_days):
+    """Días que dura el stock al ritmo medio de venta; inf para lo que no se vende"""
+    numpy = get_numpy()
+    daily = units / observed_days
+    cover = numpy.full(len(stocks), numpy.inf)
+    numpy.divide(stocks, daily, out=cover, where=daily > 0)
+    return cover
+
+def dead_stock(stocks, idle_days, min_days=DEAD_STOCK_DAYS):
+    """Máscara de productos con stock que llevan min_days o más sin venderse"""
+    return (stocks > 0) & (idle_days >= min_days)
+
+def smallest(values, count):
+    """Posiciones de los count valores menores, de menor a mayor, sin ordenar el resto"""
+    numpy = get_numpy()
+    if len(values) > count:
+        candidates = numpy.argpartition(values, count)[:count]
+    else:
+        candidates = numpy.arange(len(values))
+    return candidates[numpy.argsort(values[candidates], kind="stable")]
+
+def analytics_snapshot(repository, ledger, today=None):
+    """Copia de lo que necesita inventory_analytics, tomada en el hilo de la interfaz.
+
+    Con ella el cálculo puede seguir en otro hilo mientras cambian el catálogo y el libro.
+    """
+    numpy = get_numpy()
+    product_ids = numpy.frombuffer(repository.row_ids(), dtype=numpy.int64)
+    catalog = repository.catalog()
+    if isinstance(catalog, ProductColumns):
+        prices, stocks, category_codes, categories = inventory_columns(catalog)
+        columns = (prices.copy(), stocks.copy(), category_codes.copy(), list(categories))
+        # Las vistas de las columnas no deben sobrevivir a la copia
+        del prices, stocks, category_codes
+    else:
+        columns = list(catalog)  # Los Product son inmutables: basta copiar la lista
+    return columns, product_ids, sales_columns(ledger, product_ids, today)
+
+def inventory_analytics(snapshot, top=3):
+    """Resumen de los paneles de analítica de Reportes a partir de analytics_snapshot.
+
+    No toca el repositorio, así que puede correr en otro hilo; las listas llevan
+    IDs de producto en vez de nombres.
+    """
+    numpy = get_numpy()
+    columns, product_ids, (revenue, units, idle_days, observed) = snapshot
+    if isinstance(columns, list):
+        columns = inventory_columns(columns)
+    prices, stocks, category_codes, categories = columns
+    values = prices * stocks
+
+    valuation = inventory_valuation(prices, stocks, category_codes, len(categories))
+    classes = abc_classes(revenue)
+    class_counts = numpy.bincount(classes, minlength=3)
+    class_revenue = numpy.bincount(classes, weights=revenue, minlength=3)
+    total_revenue = revenue.sum()
+
+    cover = days_of_cover(stocks, units, observed)
+    selling = numpy.isfinite(cover)
+    low_cover = numpy.flatnonzero(cover < LOW_COVER_DAYS)
+    low_cover = low_cover[smallest(cover[low_cover], top)]
+
+    dead = numpy.flatnonzero(dead_stock(stocks, idle_days))
+    worst_dead = dead[smallest(-values[dead], top)]
+
+    return {
+        "valuation": sorted(zip(categories, valuation.tolist()), key=lambda item: item[1], reverse=True),
+        "abc": [(int(class_counts[cls]), float(class_revenue[cls] / total_revenue) if total_revenue else 0.0)
+                for cls in range(3)],
+        "cover": {
+            "selling": int(selling.sum()),
+            "median": float(numpy.median(cover[selling])) if selling.any() else None,
+            "low": int((cover < LOW_COVER_DAYS).sum()),
+            "lowest": [(int(product_ids[row]), float(cover[row])) for row in low_cover.tolist()],
+        },
+        "dead": {
+            "count": len(dead),
+            "value": float(values[dead].sum()),
+            "top": [(int(product_ids[row]), float(values[row])) for row in worst_dead.tolist()],
+        },
+    }
+
+# Datos iniciales; los carga StartupPipeline al arrancar
+user_data = {}
+product_store = None
+
+def fold_text(text):
+    """Minúsculas sin acentos, para comparar textos de búsqueda"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def bounded_edit_distance(a, b, max_distance):
+    """Distancia de edición (con transposiciones) entre a y b, o max_distance + 1 si la supera"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+class SearchIndex:
+    """Índice invertido de trigramas, palabras y categorías para buscar productos.
+
+    Sólo guarda IDs y textos normalizados; los productos se leen del repositorio.
+    """
+    GRAM = 3
+
+    def __init__(self, items=()):
+        self._docs = {}  # ID de producto -> (clave de nombre, categoría)
+        self._category_keys = {}  # categoría -> clave normalizada, compartida por sus productos
+        self._name_grams = {}
+        self._category_grams = {}
+        self._by_category = {}
+        # Palabras normalizadas -> ids, y trigramas de palabra -> palabras (para la búsqueda tolerante)
+        self._token_docs = {"name": {}, "category": {}}
+        self._vocabulary = []
+        self._vocabulary_grams = {}
+        self._last = None  # (campos, categoría, consulta, ids) de la última búsqueda
+        for doc_id, product in items:
+            self.add(product, doc_id)
+
+    @classmethod
+    def _grams(cls, key):
+        return {key[i:i + cls.GRAM] for i in range(len(key) - cls.GRAM + 1)}
+
+    @classmethod
+    def _token_grams(cls, token):
+        return cls._grams(f"${token}$")
+
+    def _index(self, postings, key, doc_id):
+        for gram in self._grams(key):
+            postings.setdefault(gram, set()).add(doc_id)
+
+    def _unindex(self, postings, key, doc_id):
+        for gram in self._grams(key):
+            ids = postings.get(gram)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del postings[gram]
+
+    def _index_tokens(self, field, key, doc_id):
+        token_docs = self._token_docs[field]
+        for token in key.split():
+            if token not in token_docs and not self._has_token(token):
+                bisect.insort(self._vocabulary, token)
+                for gram in self._token_grams(token):
+                    self._vocabulary_grams.setdefault(gram, set()).add(token)
+            token_docs.setdefault(token, set()).add(doc_id)
+
+    def _unindex_tokens(self, field, key, doc_id):
+        token_docs = self._token_docs[field]
+        for token in key.split():
+            ids = token_docs.get(token)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del token_docs[token]
+                if not self._has_token(token):
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+                    for gram in self._token_grams(token):
+                        self._vocabulary_grams[gram].discard(token)
+
+    def _has_token(self, token):
+        return any(token in token_docs for token_docs in self._token_docs.values())
+
+    def add(self, product, doc_id):
+        name_key, category = fold_text(product.name), product.category
+        category_key = self._category_keys.get(category)
+        if category_key is None:
+            category_key = self._category_keys[category] = fold_text(category)
+        self._docs[doc_id] = (name_key, category)
+        self._index(self._name_grams, name_key, doc_id)
+        self._index(self._category_grams, category_key, doc_id)
+        self._index_tokens("name", name_key, doc_id)
+        self._index_tokens("category", category_key, doc_id)
+        self._by_category.setdefault(product.category, set()).add(doc_id)
+        self._last = None
+
+    def _unindex_doc(self, doc_id):
+        name_key, category = self._docs[doc_id]
+        category_key = self._category_keys[category]
+        self._unindex(self._name_grams, name_key, doc_id)
+        self._unindex(self._category_grams, category_key, doc_id)
+        self._unindex_tokens("name", name_key, doc_id)
+        self._unindex_tokens("category", category_key, doc_id)
+        self._by_category[category].discard(doc_id)
+        self._last = None
+
+    def remove(self, doc_id):
+        if doc_id not in self._docs:
+            return
+        self._unindex_doc(doc_id)
+        del self._docs[doc_id]
+
+    def update(self, doc_id, product):
+        """Reindexa un producto editado conservando su posición"""
+        if doc_id in self._docs:
+            self._unindex_doc(doc_id)
+        self.add(product, doc_id)
+
+    def _postings(self, fields, query):
+        """Listas de ids de cada trigrama de la consulta por campo, de menor a mayor"""
+        lists = []
+        for field in fields:
+            postings = self._name_grams if field == "name" else self._category_grams
+            lists.append(sorted((postings.get(g, frozenset()) for g in self._grams(query)), key=len))
+        return lists
+
+    @staticmethod
+    def _intersect(grams):
+        """Ids que contienen todos los trigramas"""
+        result = set(grams[0])
+        for ids in grams[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
+
+    def search_ids(self, text="", category=None, fields=("name",)):
+        """IDs de los productos cuyo nombre (o categoría, según fields) contiene text, en orden de catálogo"""
+        query = fold_text(text)
+        if not query and category is None:
+            return list(self._docs)
+        return self._search_ids(query, category, fields)
+
+    def _search_ids(self, query, category, fields):
+        """Ids (en orden de catálogo) que contienen la consulta ya normalizada"""
+        last = self._last
+        refinable = (last is not None and last[0] == fields and last[1] == category
+                     and last[2] and last[2] in query)
+        postings = self._postings(fields, query) if len(query) >= self.GRAM else None
+
+        if refinable and (postings is None or len(last[3]) <= sum(len(p[0]) for p in postings)):
+            # Consulta más larga: se refina el resultado anterior en lugar de recorrer el índice
+            candidates = last[3]
+        elif postings is not None:
+            candidates = set()
+            for grams in postings:
+                candidates |= self._intersect(grams)
+            if category is not None:
+                candidates &= self._by_category.get(category, set())
+            candidates = sorted(candidates)
+        elif category is not None:
+            candidates = sorted(self._by_category.get(category, ()))
+        else:
+            candidates = list(self._docs)
+
+        docs, category_keys = self._docs, self._category_keys
+        if not query:
+            ids = candidates
+        elif fields == ("name",):
+            ids = [i for i in candidates if query in docs[i][0]]
+        else:
+            check_name, check_category = "name" in fields, "category" in fields
+            ids = [i for i in candidates
+                   if (check_name and query in docs[i][0])
+                   or (check_category and query in category_keys[docs[i][1]])]
+        self._last = (fields, category, query, ids)
+        return ids
+
+    @staticmethod
+    def max_edits(token):
+        """Errores tolerados según la longitud de la palabra"""
+        if len(token) <= 3:
+            return 0
+        return 1 if len(token) <= 5 else 2
+
+    def _similar_tokens(self, query_token, allow_prefix):
+        """Palabras del vocabulario parecidas a query_token con su coste (0 exacta, 1 prefijo, 2+ errores)"""
+        matches = {}
+        if self._has_token(query_token):
+            matches[query_token] = 0
+        if allow_prefix:
+            start = bisect.bisect_left(self._vocabulary, query_token)
+            for token in itertools.islice(self._vocabulary, start, None):
+                if not token.startswith(query_token):
+                    break
+                matches.setdefault(token, 1)
+
+        max_distance = self.max_edits(query_token)
+        if not max_distance:
+            return matches
+
+        # Poda: una palabra a k ediciones comparte al menos len(trigramas) - 3k trigramas
+        grams = self._token_grams(query_token)
+        required = len(grams) - self.GRAM * max_distance
+        if required > 0:
+            counts = {}
+            for gram in grams:
+                for token in self._vocabulary_grams.get(gram, ()):
+                    counts[token] = counts.get(token, 0) + 1
+            candidates = [t for t, count in counts.items() if count >= required]
+        else:
+            candidates = self._vocabulary
+
+        for token in candidates:
+            if token in matches:
+                continue
+            distance = bounded_edit_distance(query_token, token, max_distance)
+            if distance > max_distance and allow_prefix and len(token) > len(query_token):
+                distance = bounded_edit_distance(query_token, token[:len(query_token)], max_distance)
+            if distance <= max_distance:
+                matches[token] = 1 + distance
+        return matches
+
+    def fuzzy_search_ids(self, text, category=None, fields=("name",)):
+        """IDs de una búsqueda tolerante a acentos y errores, ordenados: exacta > prefijo > subcadena > aproximada"""
+        query = " ".join(fold_text(text).split())
+        if not query:
+            return self.search_ids("", category, fields)
+
+        # Coste por documento: cada palabra de la consulta debe parecerse a alguna del producto
+        costs = None
+        query_tokens = query.split()
+        for position, query_token in enumerate(query_tokens):
+            similar = self._similar_tokens(query_token, allow_prefix=position == len(query_tokens) - 1)
+            token_costs = {}
+            for field in fields:
+                token_docs = self._token_docs[field]
+                for token, cost in similar.items():
+                    for doc_id in token_docs.get(token, ()):
+                        if cost < token_costs.get(doc_id, cost + 1):
+                            token_costs[doc_id] = cost
+            if costs is None:
+                costs = token_costs
+            else:
+                costs = {doc_id: cost + token_costs[doc_id] for doc_id, cost in costs.items()
+                         if doc_id in token_costs}
+            if not costs:
+                break
+
+        # Las coincidencias por subcadena siempre se incluyen
+        substring_ids = set(self._search_ids(query, category, fields))
+        in_category = self._by_category.get(category, set()) if category is not None else None
+
+        ranked = []
+        for doc_id in substring_ids.union(costs or ()):
+            if in_category is not None and doc_id not in in_category:
+                continue
+            name_key = self._docs[doc_id][0]
+            if name_key == query:
+                rank = (0, 0)
+            elif name_key.startswith(query):
+                rank = (1, 0)
+            elif doc_id in substring_ids:
+                rank = (2, 0)
+            else:
+                rank = (3, costs[doc_id])
+            ranked.append((rank, doc_id))
+        ranked.sort()
+        return [doc_id for _, doc_id in ranked]
+
+# Índice de búsqueda y bus de cambios del catálogo; el repositorio se crea al arrancar
+search_index = SearchIndex()
+catalog_events = CatalogEvents()
+order_ledger = OrderLedger()
+product_repository = None
+
+def search_product_ids(text, category=None, fields=("name",)):
+    """Busca en el catálogo con el modo elegido en Mi Cuenta (tolerante o por subcadena)"""
+    if user_data.get("fuzzy_search", True):
+        return search_index.fuzzy_search_ids(text, category, fields)
+    return search_index.search_ids(text, category, fields)
+
+def search_products(text, category=None, fields=("name",)):
+    """Productos encontrados por search_product_ids"""
+    return [product_repository.get(product_id) for product_id in search_product_ids(text, category, fields)]
+
+class ImageCache:
+    """Caché LRU compartida de imágenes escaladas por ruta, tamaño y fecha de modificación"""
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES, stat_ttl=IMAGE_STAT_TTL):
+        self.max_bytes = max_bytes
+        self.stat_ttl = stat_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (ruta, ancho, alto, mtime) -> QPixmap
+        self._keys_by_path = {}
+        self._mtimes = {}  # ruta -> (instante de la consulta, mtime o None)
+        self._bytes = 0
+
+    def _mtime(self, path):
+        """Fecha de modificación de la ruta, consultada al disco como mucho cada stat_ttl segundos"""
+        now = time.monotonic()
+        cached = self._mtimes.get(path)
+        if cached is not None and now - cached[0] < self.stat_ttl:
+            return cached[1]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if cached is not None and cached[1] != mtime:
+            self.invalidate(path)
+        self._mtimes[path] = (now, mtime)
+        return mtime
+
+    def resolve(self, image_path):
+        """Ruta real a decodificar (la imagen por defecto si falta la original)"""
+        mtime = self._mtime(image_path)
+        if mtime is not None:
+            return image_path, mtime
+        return DEFAULT_IMAGE_PATH, self._mtime(DEFAULT_IMAGE_PATH)
+
+    def cached(self, image_path, width, height):
+        """Devuelve el pixmap si ya está en caché, sin decodificar nada"""
+        source, mtime = self.resolve(image_path)
+        key = (source, width, height, mtime)
+        pixmap = self._entries.get(key)
+        if pixmap is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pixmap
+
+    def pixmap(self, image_path, width, height):
+        """Pixmap de la imagen ajustado a width x height conservando la proporción"""
+        pixmap = self.cached(image_path, width, height)
+        if pixmap is not None:
+            return pixmap
+
+        self.misses += 1
+        source, mtime = self.resolve(image_path)
+        pixmap = QPixmap(source) if mtime is not None else QPixmap()
+        if pixmap.isNull():
+            pixmap = QPixmap(width, height)
+            pixmap.fill(QColor("#FEFAE0"))
+        else:
+            pixmap = pixmap.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.insert(source, width, height, mtime, pixmap)
+        return pixmap
+
+    def insert(self, source, width, height, mtime, pixmap):
+        """Guarda un pixmap ya escalado y aplica el presupuesto de memoria"""
+        key = (source, width, height, mtime)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= self._size_of(previous)
+        self._entries[key] = pixmap
+        self._keys_by_path.setdefault(source, set()).add(key)
+        self._bytes += self._size_of(pixmap)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            old_key, old_pixmap = self._entries.popitem(last=False)
+            self._bytes -= self._size_of(old_pixmap)
+            self._keys_by_path.get(old_key[0], set()).discard(old_key)
+
+    def invalidate(self, path=None):
+        """Descarta las entradas de una ruta (o todas si no se indica)"""
+        if path is None:
+            self._entries.clear()
+            self._keys_by_path.clear()
+            self._mtimes.clear()
+            self._bytes = 0
+            return
+        for key in self._keys_by_path.pop(path, ()):
+            pixmap = self._entries.pop(key, None)
+            if pixmap is not None:
+                self._bytes -= self._size_of(pixmap)
+        self._mtimes.pop(path, None)
+
+    def stats(self):
+        """Contadores de uso de la caché"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    @staticmethod
+    def _size_of(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+# Caché de imágenes compartida por tarjetas, diálogos e inventario
+image_cache = ImageCache()
+
+class ThumbnailDiskCache:
+    """Miniaturas preescaladas en disco, una por tamaño usado en la interfaz"""
+    def __init__(self, directory=THUMBNAIL_DIR, sizes=THUMBNAIL_SIZES):
+        self.directory = directory
+        self.sizes = tuple(sizes)
+
+    @staticmethod
+    def source_key(source):
+        return hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:20]
+
+    def path_for(self, source, mtime, width, height):
+        return os.path.join(self.directory, f"{self.source_key(source)}_{mtime:x}_{width}x{height}.png")
+
+    def read(self, source, mtime, width, height):
+        """Lee una miniatura ya generada; devuelve None si no existe"""
+        path = self.path_for(source, mtime, width, height)
+        if not os.path.exists(path):
+            return None
+        image = QImage(path)
+        return None if image.isNull() else image
+
+    def write_renditions(self, source, mtime):
+        """Decodifica el original una vez y guarda todas las miniaturas; devuelve {(ancho, alto): QImage}"""
+        reader = QImageReader(source)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            max_width = max(w for w, _ in self.sizes) * 2
+            max_height = max(h for _, h in self.sizes) * 2
+            size.scale(min(size.width(), max_width), min(size.height(), max_height), Qt.KeepAspectRatio)
+            reader.setScaledSize(size)
+        image = reader.read()
+        if image.isNull():
+            return {}
+
+        # Las miniaturas de una versión anterior del original las borra prune()
+        renditions = {}
+        for width, height in self.sizes:
+            rendition = image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            path = self.path_for(source, mtime, width, height)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            if rendition.save(tmp_path, "PNG"):
+                try:
+                    os.replace(tmp_path, path)
+                except OSError:
+                    pass
+            renditions[(width, height)] = rendition
+        return renditions
+
+    def remove(self, source):
+        """Borra todas las miniaturas de una imagen (p. ej. al eliminar su producto)"""
+        prefix = self.source_key(source) + "_"
+        for filename in self._filenames():
+            if filename.startswith(prefix):
+                self._unlink(filename)
+
+    def prune(self, valid_sources):
+        """Borra las miniaturas de imágenes que ya no usa ningún producto o que cambiaron desde que se generaron"""
+        current_mtimes = {}
+        for source in valid_sources:
+            try:
+                current_mtimes[self.source_key(source)] = f"{os.stat(source).st_mtime_ns:x}"
+            except OSError:
+                pass
+        for filename in self._filenames():
+            key, _, rest = filename.partition("_")
+            if current_mtimes.get(key) != rest.split("_", 1)[0]:
+                self._unlink(filename)
+
+    def _filenames(self):
+        try:
+            return os.listdir(self.directory)
+        except OSError:
+            return []
+
+    def _unlink(self, filename):
+        try:
+            os.remove(os.path.join(self.directory, filename))
+        except OSError:
+            pass
+
+# Miniaturas persistentes entre ejecuciones
+thumbnail_disk_cache = ThumbnailDiskCache()
+
+class ThumbnailTask(QRunnable):
+    """Decodifica una imagen directamente al tamaño destino en un hilo del pool"""
+    def __init__(self, loader, key, source, mtime, disk_cache):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.loader = loader
+        self.disk_cache = disk_cache
+        self.key = key
+        self.source = source
+        self.mtime = mtime
+        self.owners = set()
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            return
+        _, width, height = self.key
+        if (width, height) in self.disk_cache.sizes:
+            image = self.disk_cache.read(self.source, self.mtime, width, height)
+            if image is None:
+                image = self.disk_cache.write_renditions(self.source, self.mtime).get((width, height), QImage())
+            if not self.cancelled:
+                self.loader._decoded.emit(self, image)
+            return
+
+        reader = QImageReader(self.source)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            # Decodificación escalada al doble del destino y suavizado final
+            size.scale(min(size.width(), width * 2), min(size.height(), height * 2), Qt.KeepAspectRatio)
+            reader.setScaledSize(size)
+        image = reader.read()
+        if not image.isNull():
+            image = image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if not self.cancelled:
+            self.loader._decoded.emit(self, image)
+
+class ThumbnailLoader(QObject):
+    """Carga asíncrona de miniaturas: devuelve un marcador y avisa cuando la imagen está lista"""
+    thumbnail_ready = pyqtSignal(str, int, int)
+    _decoded = pyqtSignal(object, QImage)
+    _warmed = pyqtSignal(str, object, int, int, QImage)
+
+    def __init__(self, cache, disk_cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.disk_cache = disk_cache
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, QThread.idealThreadCount() - 1))
+        self._pending = {}  # (ruta, ancho, alto) -> ThumbnailTask
+        self._seen = {}  # propietario -> claves pedidas desde el último barrido
+        self._decoded.connect(self._on_decoded)
+        self._warmed.connect(self._on_warmed)
+
+    def request(self, image_path, width, height, owner=None):
+        """Pixmap en caché o el marcador DEFAULT_IMAGE_PATH mientras se decodifica"""
+        pixmap = self.cache.cached(image_path, width, height)
+        if pixmap is not None:
+            return pixmap
+
+        source, mtime = self.cache.resolve(image_path)
+        if source == DEFAULT_IMAGE_PATH or mtime is None:
+            return self.cache.pixmap(image_path, width, height)
+
+        key = (image_path, width, height)
+        self._seen.setdefault(owner, set()).add(key)
+        task = self._pending.get(key)
+        if task is None:
+            task = ThumbnailTask(self, key, source, mtime, self.disk_cache)
+            self._pending[key] = task
+            self.pool.start(task)
+        task.owners.add(owner)
+        return self.cache.pixmap(DEFAULT_IMAGE_PATH, width, height)
+
+    def warm(self, image_paths, width, height, report=None):
+        """Decodifica miniaturas en el hilo que llama (el de arranque) y las pasa a la caché"""
+        image_paths = list(image_paths)
+        for count, image_path in enumerate(image_paths, 1):
+            try:
+                mtime = os.stat(image_path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is not None:
+                image = self.disk_cache.read(image_path, mtime, width, height)
+                if image is None:
+                    image = self.disk_cache.write_renditions(image_path, mtime).get((width, height))
+                if image is not None and not image.isNull():
+                    self._warmed.emit(image_path, mtime, width, height, image)
+            if report is not None:
+                report(count / len(image_paths))
+
+    def cancel(self, owner):
+        """Cancela las peticiones pendientes de un propietario (p. ej. tras filtrar)"""
+        self._seen.pop(owner, None)
+        for key in [k for k, task in self._pending.items() if owner in task.owners]:
+            self._release(key, owner)
+
+    def sweep(self, owner):
+        """Cancela lo que el propietario no ha vuelto a pedir (tarjetas fuera de la vista)"""
+        seen = self._seen.pop(owner, set())
+        for key in [k for k, task in self._pending.items() if owner in task.owners and k not in seen]:
+            self._release(key, owner)
+
+    def shutdown(self):
+        """Descarta la cola y espera a las decodificaciones en curso"""
+        for task in self._pending.values():
+            task.cancelled = True
+        self.pool.clear()
+        self.pool.waitForDone()
+        self._pending.clear()
+
+    def _release(self, key, owner):
+        task = self._pending[key]
+        task.owners.discard(owner)
+        if not task.owners:
+            task.cancelled = True
+            self.pool.tryTake(task)
+            del self._pending[key]
+
+    def _on_decoded(self, task, image):
+        if self._pending.get(task.key) is not task:
+            return
+        del self._pending[task.key]
+        image_path, width, height = task.key
+        if image.isNull():
+            pixmap = QPixmap(width, height)
+            pixmap.fill(QColor("#FEFAE0"))
+        else:
+            pixmap = QPixmap.fromImage(image)
+        self.cache.insert(task.source, width, height, task.mtime, pixmap)
+        self.thumbnail_ready.emit(image_path, width, height)
+
+    def _on_warmed(self, source, mtime, width, height, image):
+        # Los QPixmap sólo pueden crearse en el hilo de la interfaz
+        self.cache.insert(source, width, height, mtime, QPixmap.fromImage(image))
+
+# Decodificación de miniaturas fuera del hilo de la interfaz
+thumbnail_loader = ThumbnailLoader(image_cache, thumbnail_disk_cache)
+
+# Hoja de estilos de la interfaz, la misma para el menú y para cada vista; los widgets
+# se marcan con la propiedad "themeRole" o con objectName y el tema sólo rellena los colores
+APP_STYLESHEET = """
+QWidget[themeRole="view"], QWidget[themeRole="view"] * {{
+    background-color: {background};
+}}
+
+QFrame[themeRole="card"], QFrame[themeRole="card"] QFrame {{
+    background-color: {card_bg};
+    border-radius: 20px;
+    border: 1px solid {border};
+}}
+QFrame[themeRole="card"]:hover, QFrame[themeRole="card"] QFrame:hover {{
+    border: 2px solid {primary};
+}}
+
+QDialog[themeRole="dialog"] {{
+    background-color: {background};
+    border-radius: 20px;
+}}
+QLabel[themeRole="dialogTitle"] {{
+    font-size: 24px;
+    font-weight: bold;
+    color: {primary};
+    margin-bottom: 20px;
+}}
+QLabel[themeRole="bodyText"] {{
+    color: {text};
+}}
+
+QLineEdit[themeRole="search"] {{
+    border: 2px solid {border};
+    border-radius: 22px;
+    padding: 12px 20px;
+    font-size: 16px;
+    color: {text};
+    background-color: {card_bg};
+}}
+QLineEdit[themeRole="search"]:focus {{
+    border: 2px solid {primary};
+}}
+QComboBox[themeRole="search"] {{
+    border: 2px solid {border};
+    border-radius: 22px;
+    padding: 12px 20px;
+    font-size: 16px;
+    color: {text};
+    background-color: {card_bg};
+    min-width: 200px;
+}}
+QComboBox[themeRole="search"]:hover {{
+    border: 2px solid {primary};
+}}
+QComboBox[themeRole="search"]::drop-down {{
+    border: none;
+    width: 30px;
+}}
+QComboBox[themeRole="search"]::down-arrow {{
+    image: none;
+    border-left: 5px solid transparent;
+    border-right: 5px solid transparent;
+    border-top: 5px solid {text};
+    margin-right: 10px;
+}}
+
+QLineEdit[themeRole="field"], QComboBox[themeRole="field"] {{
+    border: 2px solid {border};
+    border-radius: 10px;
+    padding: 10px 15px;
+    font-size: 14px;
+    color: {text};
+    background-color: {card_bg};
+}}
+QLineEdit[themeRole="field"]:focus, QComboBox[themeRole="field"]:hover {{
+    border: 2px solid {primary};
+}}
+
+QCheckBox[themeRole="switch"]::indicator {{
+    width: 20px;
+    height: 20px;
+    border-radius: 10px;
+    border: 2px solid {border};
+    background-color: {card_bg};
+}}
+QCheckBox[themeRole="switch"]::indicator:checked {{
+    background-color: {primary};
+    border: 2px solid {primary};
+}}
+
+QFrame[themeRole="card"] QFrame[themeRole="setting"],
+QFrame[themeRole="card"] QFrame[themeRole="setting"] QFrame {{
+    background-color: {header_bg};
+    border-radius: 10px;
+    border: 1px solid {border};
+}}
+QFrame[themeRole="card"] QFrame[themeRole="avatar"] {{
+    background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+        stop:0 {gradient_start}, stop:1 {gradient_end});
+    border-radius: 50px;
+    border: 3px solid {border};
+}}
+
+QPushButton[themeRole="primary"] {{
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+        stop:0 {gradient_start}, stop:1 {gradient_end});
+    color: white;
+    font-weight: 600;
+    border-radius: 25px;
+    padding: 15px 30px;
+    font-size: 16px;
+    border: none;
+}}
+QPushButton[themeRole="primary"]:hover {{
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+        stop:0 {button_hover}, stop:1 {gradient_end});
+}}
+QPushButton[themeRole="secondary"] {{
+    background-color: {border};
+    color: {text};
+    font-weight: 600;
+    border-radius: 25px;
+    padding: 15px 30px;
+    font-size: 16px;
+    border: none;
+}}
+QPushButton[themeRole="secondary"]:hover {{
+    background-color: {grey_text};
+    color: white;
+}}
+
+QPushButton[themeRole="cart"] {{
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+        stop:0 {gradient_start}, stop:1 {gradient_end});
+    color: white;
+    font-weight: 700;
+    border-radius: 20px;
+    padding: 10px 15px;
+    font-size: 14px;
+    border: none;
+}}
+QPushButton[themeRole="cart"]:hover {{
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+        stop:0 {button_hover}, stop:1 {gradient_end});
+}}
+QPushButton[themeRole="cart"]:pressed {{
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+        stop:0 {button_pressed}, stop:1 {gradient_end});
+}}
+
+QTableView#inventoryTable {{
+    background-color: {card_bg};
+    border: none;
+    border-radius: 15px;
+    gridline-color: {border};
+    color: {text};
+    font-size: 14px;
+    selection-background-color: {selection_bg};
+}}
+QTableView#inventoryTable QHeaderView::section {{
+    background-color: {header_bg};
+    color: {text};
+    padding: 15px;
+    border: none;
+    border-bottom: 2px solid {border};
+    font-weight: bold;
+    font-size: 14px;
+}}
+QTableView#inventoryTable::item {{
+    padding: 10px;
+    border-bottom: 1px solid {border};
+}}
+QTableView#inventoryTable::item:selected {{
+    background-color: {selection_bg};
+    color: {text};
+}}
+
+QStatusBar {{
+    background-color: {card_bg};
+    color: {text};
+    border-top: 1px solid {border};
+}}
+
+QFrame#menuContainer, QFrame#menuContainer QFrame {{
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+        stop:0 {gradient_start}, stop:1 {gradient_end});
+    border: none;
+}}
+QFrame#menuContainer QListWidget#menu {{
+    background-color: transparent;
+    border: none;
+    padding: 10px 0px;
+    outline: 0;
+}}
+QListWidget#menu::item {{
+    border-radius: 15px;
+    margin: 5px 15px;
+    padding: 0px;
+}}
+QListWidget#menu::item:hover {{
+    background-color: rgba(255, 255, 255, 0.1);
+}}
+QListWidget#menu::item:selected {{
+    background-color: rgba(255, 255, 255, 0.2);
+    border: 2px solid rgba(255, 255, 255, 0.3);
+}}
+QFrame#menuContainer QLabel#miniAvatar {{
+    background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+        stop:0 {gradient_start}, stop:1 {gradient_end});
+    border-radius: 20px;
+    color: white;
+    font-weight: bold;
+    font-size: 14px;
+}}
+"""
+
+class ThemeEngine:
+    """Aplica los temas con una única hoja de estilos por tema, generada una sola vez"""
+    def __init__(self, template=APP_STYLESHEET):
+        self.template = template
+        self._stylesheets = {}
+        self.active = "Claro"
+
+    def stylesheet(self, theme_name):
+        """Hoja de estilos del tema, construida la primera vez que se pide"""
+        stylesheet = self._stylesheets.get(theme_name)
+        if stylesheet is None:
+            stylesheet = self._stylesheets[theme_name] = self.template.format(**THEMES[theme_name])
+        return stylesheet
+
+    def apply(self, widget):
+        """Pone la hoja del tema activo en widget si tenía otra; Qt sólo vuelve a pulir sus hijos.
+
+        Cambiar la hoja de QApplication repule todas las ventanas y vistas, también las
+        ocultas, así que el tema se aplica por contenedor: el menú y cada vista al mostrarse.
+        """
+        if widget.property("themeName") == self.active:
+            return False
+        widget.setAttribute(Qt.WA_StyledBackground, True)
+        widget.setStyleSheet(self.stylesheet(self.active))
+        widget.setProperty("themeName", self.active)
+        return True
+
+def set_theme_role(widget, role):
+    """Marca un widget para los selectores [themeRole=...] de la hoja de estilos"""
+    widget.setProperty("themeRole", role)
+    return widget
+
+theme_engine = ThemeEngine()
+
+class ShadowCache:
+    """Sombras difuminadas una sola vez y guardadas como nine-patch; se estiran al tamaño de cada widget"""
+    def __init__(self):
+        self._tiles = {}
+
+    def _tile(self, blur, radius, color, width, height):
+        # La forma sólo necesita el tamaño real en las dimensiones que no llegan a estirarse
+        side = 2 * (radius + blur) + 1
+        shape_w, shape_h = min(width, side), min(height, side)
+        key = (blur, radius, color.rgba(), shape_w, shape_h)
+        tile = self._tiles.get(key)
+        if tile is None:
+            image = QImage(shape_w + 2 * blur, shape_h + 2 * blur, QImage.Format_ARGB32_Premultiplied)
+            image.fill(Qt.transparent)
+            scene = QGraphicsScene()
+            path = QPainterPath()
+            path.addRoundedRect(QRectF(0, 0, shape_w, shape_h), radius, radius)
+            item = scene.addPath(path, QPen(Qt.NoPen), QBrush(color))
+            effect = QGraphicsBlurEffect()
+            effect.setBlurRadius(blur)
+            effect.setBlurHints(QGraphicsBlurEffect.QualityHint)
+            item.setGraphicsEffect(effect)
+            painter = QPainter(image)
+            scene.render(painter, QRectF(image.rect()), QRectF(-blur, -blur, image.width(), image.height()))
+            painter.end()
+            tile = self._tiles[key] = QPixmap.fromImage(image)
+        return tile
+
+    @staticmethod
+    def _slices(source, target):
+        """Tramos (origen, largo, destino, largo) de una dimensión; sólo se estira el píxel central"""
+        if target <= source:
+            return ((0, source, 0, target),)
+        middle = source // 2
+        rest = source - middle - 1
+        return ((0, middle, 0, middle),
+                (middle, 1, middle, target - middle - rest),
+                (middle + 1, rest, target - rest, rest))
+
+    def draw(self, painter, rect, blur, radius, color):
+        """Pinta la sombra de rect (sin desplazar) con la nine-patch en caché"""
+        rect = rect.toRect() if isinstance(rect, QRectF) else rect
+        if rect.width() <= 0 or rect.height() <= 0:
+            return
+        tile = self._tile(blur, radius, color, rect.width(), rect.height())
+        left, top = rect.x() - blur, rect.y() - blur
+        for sx, sw, dx, dw in self._slices(tile.width(), rect.width() + 2 * blur):
+            for sy, sh, dy, dh in self._slices(tile.height(), rect.height() + 2 * blur):
+                painter.drawPixmap(QRect(left + dx, top + dy, dw, dh), tile, QRect(sx, sy, sw, sh))
+
+shadow_cache = ShadowCache()
+
+class ModernShadowEffect(QGraphicsEffect):
+    """Efecto de sombra; la pinta desde shadow_cache en vez de difuminar el widget en cada repintado"""
+    def __init__(self, parent=None, blur_radius=20, offset=QPoint(0, 8), color=None, corner_radius=20):
         super().__init__(parent)
         if color is None:
             color = QColor(0, 0, 0, 60)
-        self.setBlurRadius(blur_radius)
-        self.setXOffset(offset.x())
-        self.setYOffset(offset.y())
-        self.setColor(color)
+        self.blur_radius = blur_radius
+        self.offset = QPoint(offset)
+        self.color = color
+        self.corner_radius = corner_radius
+
+    def set_shadow(self, blur_radius, offset):
+        """Cambia el tamaño de la sombra sin crear otro efecto"""
+        self.blur_radius = blur_radius
+        self.offset = QPoint(offset)
+        self.updateBoundingRect()
+        self.update()
+
+    def boundingRectFor(self, rect):
+        blur = self.blur_radius
+        return rect.united(rect.translated(self.offset.x(), self.offset.y()).adjusted(-blur, -blur, blur, blur))
+
+    def draw(self, painter):
+        rect = self.sourceBoundingRect(Qt.LogicalCoordinates).toRect()
+        radius = min(self.corner_radius, rect.width() // 2, rect.height() // 2)
+        shadow_cache.draw(painter, rect.translated(self.offset), self.blur_radius, radius, self.color)
+        # El widget se pinta en un pixmap aparte: dibujarlo directamente falla con efectos anidados
+        pixmap, offset = self.sourcePixmap(Qt.LogicalCoordinates, QGraphicsEffect.NoPad)
+        painter.drawPixmap(offset, pixmap)
 
 class AnimatedButton(QPushButton):
     """Botón con animacion"""
-    def __init__(self, text="", parent=None):
+    def __init__(self, text="", parent=None, corner_radius=6):
         super().__init__(text, parent)
         self.setCursor(QCursor(Qt.PointingHandCursor))
-        self.setGraphicsEffect(ModernShadowEffect(self, blur_radius=15, offset=QPoint(0, 4)))
+        # Un único efecto por botón; al pasar el ratón sólo cambia su tamaño
+        self.shadow = ModernShadowEffect(self, blur_radius=15, offset=QPoint(0, 4), corner_radius=corner_radius)
+        self.setGraphicsEffect(self.shadow)
         
     def enterEvent(self, event):
-        self.setGraphicsEffect(ModernShadowEffect(self, blur_radius=25, offset=QPoint(0, 8)))
+        self.shadow.set_shadow(25, QPoint(0, 8))
         super().enterEvent(event)
         
     def leaveEvent(self, event):
-        self.setGraphicsEffect(ModernShadowEffect(self, blur_radius=15, offset=QPoint(0, 4)))
+        self.shadow.set_shadow(15, QPoint(0, 4))
         super().leaveEvent(event)
 
 class ModernCard(QFrame):
@@ -211,18 +2582,7 @@ class ModernCard(QFrame):
         super().__init__(parent)
         self.setFrameStyle(QFrame.NoFrame)
         self.setGraphicsEffect(ModernShadowEffect(self, blur_radius=20, offset=QPoint(0, 6)))
-        
-    def apply_theme(self, theme):
-        self.setStyleSheet(f"""
-            QFrame {{
-                background-color: {theme['card_bg']};
-                border-radius: 20px;
-                border: 1px solid {theme['border']};
-            }}
-            QFrame:hover {{
-                border: 2px solid {theme['primary']};
-            }}
-        """)
+        set_theme_role(self, "card")
 
 class StatsCard(ModernCard):
     """Tarjeta de estadísticas"""
@@ -259,190 +2619,273 @@ class StatsCard(ModernCard):
     def update_value(self, new_value):
         self.value_label.setText(str(new_value))
 
-class ProductCard(ModernCard):
-    """Widget de tarjeta de producto"""
-    def __init__(self, product):
-        super().__init__()
-        self.product_data = product
-        name, price, image_path, category, stock = product
+def show_product_details_dialog(product, parent=None):
+    """Muestra el diálogo de detalles de un producto"""
+    name, price, image_path, category, stock = product
+    dialog = QDialog(parent)
+    dialog.setWindowTitle(f"Detalles de {name}")
+    dialog.setFixedSize(500, 600)
+    set_theme_role(dialog, "dialog")
+
+    layout = QVBoxLayout(dialog)
+    layout.setSpacing(20)
+    layout.setContentsMargins(30, 30, 30, 30)
+
+    # Imagen grande
+    img_container = ModernCard()
+    img_container.setFixedSize(300, 200)
+    img_layout = QVBoxLayout(img_container)
+    
+    img_lbl = QLabel()
+    img_lbl.setPixmap(thumbnail_loader.request(image_path, 280, 180, owner=dialog))
+
+    def on_thumbnail_ready(ready_path, width, height):
+        if ready_path == image_path and (width, height) == (280, 180):
+            img_lbl.setPixmap(image_cache.pixmap(image_path, 280, 180))
+    thumbnail_loader.thumbnail_ready.connect(on_thumbnail_ready)
+    img_lbl.setAlignment(Qt.AlignCenter)
+    img_layout.addWidget(img_lbl)
+    
+    layout.addWidget(img_container, alignment=Qt.AlignCenter)
 
-        self.setFixedSize(220, 320)
-        self.setCursor(QCursor(Qt.PointingHandCursor))
+    # Información detallada
+    info_card = ModernCard()
+    info_layout = QVBoxLayout(info_card)
+    info_layout.setContentsMargins(25, 20, 25, 20)
+    
+    name_lbl = QLabel(f"<h2 style='color: {current_theme['primary']};'>{name}</h2>")
+    name_lbl.setAlignment(Qt.AlignCenter)
+    info_layout.addWidget(name_lbl)
+
+    details_lbl = QLabel(f"""
+        <div style='font-size: 16px; line-height: 1.6;'>
+            <p><b>Categoría:</b> <span style='color: {current_theme['secondary']};'>{category}</span></p>
+            <p><b>Precio:</b> <span style='color: {current_theme['accent']}; font-size: 18px;'>${price:.2f}</span></p>
+            <p><b>Stock Disponible:</b> <span style='color: {current_theme['success']};'>{stock} unidades</span></p>
+            <p><b>Descripción:</b> Delicioso {name.lower()} preparado con ingredientes frescos y de la más alta calidad.</p>
+        </div>
+    """)
+    details_lbl.setWordWrap(True)
+    set_theme_role(details_lbl, "bodyText")
+    info_layout.addWidget(details_lbl)
+    
+    layout.addWidget(info_card)
 
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(15, 15, 15, 15)
-        layout.setSpacing(12)
-
-        # Imagen del producto con marco redondeado
-        image_container = QFrame()
-        image_container.setFixedSize(190, 160)
-        image_container.setStyleSheet("""
-            QFrame {
-                border-radius: 15px;
-                background-color: #F8F9FA;
-            }
-        """)
-        
-        image_layout = QVBoxLayout(image_container)
-        image_layout.setContentsMargins(5, 5, 5, 5)
-        
-        self.image_label = QLabel()
-        pixmap = QPixmap(image_path) if os.path.exists(image_path) else QPixmap(DEFAULT_IMAGE_PATH)
-        if pixmap.isNull():
-            pixmap = QPixmap(180, 150)
-            pixmap.fill(QColor("#FEFAE0"))
-        self.image_label.setPixmap(pixmap.scaled(180, 150, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        self.image_label.setAlignment(Qt.AlignCenter)
-        image_layout.addWidget(self.image_label)
-        
-        layout.addWidget(image_container, alignment=Qt.AlignCenter)
+    # Botón cerrar
+    close_btn = AnimatedButton("Cerrar")
+    close_btn.setFixedHeight(45)
+    close_btn.clicked.connect(dialog.accept)
+    layout.addWidget(close_btn)
 
-        # Información del producto
-        info_container = QFrame()
-        info_layout = QVBoxLayout(info_container)
-        info_layout.setContentsMargins(0, 0, 0, 0)
-        info_layout.setSpacing(8)
+    dialog.exec_()
+    thumbnail_loader.thumbnail_ready.disconnect(on_thumbnail_ready)
+    thumbnail_loader.cancel(dialog)
 
-        # Nombre del producto
-        self.name_label = QLabel(name)
-        self.name_label.setAlignment(Qt.AlignCenter)
-        self.name_label.setWordWrap(True)
-        info_layout.addWidget(self.name_label)
+# Rol para obtener la tupla completa del producto desde los modelos
+ProductRole = Qt.UserRole + 1
+ProductIdRole = Qt.UserRole + 3
 
-        # Precio y stock
-        details_layout = QHBoxLayout()
-        self.price_label = QLabel(f"${price:.2f}")
-        self.price_label.setAlignment(Qt.AlignLeft)
-        details_layout.addWidget(self.price_label)
+class ProductGridModel(QAbstractListModel):
+    """Modelo de productos para la cuadrícula virtualizada; cada fila guarda el ID del producto"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ids = array("q")
+        self._row_by_id = {}
+
+    def set_product_ids(self, product_ids):
+        """Reemplaza los productos mostrados sin crear widgets"""
+        self.beginResetModel()
+        self._ids = array("q", product_ids)
+        self._row_by_id = {product_id: row for row, product_id in enumerate(self._ids)}
+        self.endResetModel()
+
+    def _row_of(self, product_id):
+        return self._row_by_id.get(product_id)
+
+    def append_product(self, product_id):
+        row = len(self._ids)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._ids.append(product_id)
+        self._row_by_id[product_id] = row
+        self.endInsertRows()
+
+    def refresh_product(self, product_id):
+        """Vuelve a pintar la tarjeta de un producto editado"""
+        row = self._row_of(product_id)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def remove_product(self, product_id):
+        row = self._row_of(product_id)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._ids[row]
+            del self._row_by_id[product_id]
+            # Las filas siguientes suben una posición
+            for moved_id in itertools.islice(self._ids, row, None):
+                self._row_by_id[moved_id] -= 1
+            self.endRemoveRows()
+
+    def product_at(self, row):
+        return product_repository.get(self._ids[row])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._ids):
+            return None
+        product = self.product_at(index.row())
+        if product is None:
+            return None
+        if role == Qt.DisplayRole:
+            return product.name
+        if role == ProductRole:
+            return product
+        if role == ProductIdRole:
+            return self._ids[index.row()]
+        return None
+
+class ProductCardDelegate(QStyledItemDelegate):
+    """Pinta cada producto como una tarjeta sin instanciar widgets"""
+    CARD_SIZE = QSize(220, 320)
+    SPACING = 25
+    # Sombra de la tarjeta; cabe en el espacio entre celdas para que repintar una no corte las vecinas
+    SHADOW_BLUR = 10
+    SHADOW_OFFSET = QPoint(0, 4)
+    SHADOW_COLOR = QColor(0, 0, 0, 60)
+    add_to_cart = pyqtSignal(int)
 
-        self.stock_label = QLabel(f"Stock: {stock}")
-        self.stock_label.setAlignment(Qt.AlignRight)
-        details_layout.addWidget(self.stock_label)
-        info_layout.addLayout(details_layout)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.theme = current_theme
+        self.shadows = True  # False en el modo de efectos reducidos
+        self._double_click = False
+
+    def set_theme(self, theme):
+        self.theme = theme
+
+    def sizeHint(self, option, index):
+        return QSize(self.CARD_SIZE.width() + self.SPACING, self.CARD_SIZE.height() + self.SPACING)
+
+    def card_rect(self, cell):
+        """Tarjeta centrada dentro de la celda de la cuadrícula"""
+        return QRectF(cell.x() + (cell.width() - self.CARD_SIZE.width()) / 2,
+                      cell.y() + (self.SPACING / 2) - 4,
+                      self.CARD_SIZE.width(), self.CARD_SIZE.height())
+
+    def button_rect(self, cell):
+        """Botón "Añadir al Carrito" de la tarjeta"""
+        card = self.card_rect(cell)
+        return QRectF(card.x() + 15, card.bottom() - 55, 190, 40)
+
+    def editorEvent(self, event, model, option, index):
+        kind = event.type()
+        if kind == QEvent.MouseButtonPress:
+            self._double_click = False
+        elif kind == QEvent.MouseButtonDblClick:
+            # Un doble clic llega como pulsar, soltar, doble clic y soltar: la segunda
+            # liberación no debe añadir otra unidad
+            self._double_click = True
+        elif (kind == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton
+                and self.button_rect(option.rect).contains(QPointF(event.pos()))):
+            if self._double_click:
+                self._double_click = False
+            else:
+                self.add_to_cart.emit(index.data(ProductIdRole))
+            return True
+        return super().editorEvent(event, model, option, index)
 
-        layout.addWidget(info_container)
+    def paint(self, painter, option, index):
+        product = index.data(ProductRole)
+        if product is None:
+            return
+        name, price, image_path, category, stock = product
+        theme = self.theme
+        hovered = bool(option.state & QStyle.State_MouseOver)
 
-        # Botón de añadir mejorado
-        self.add_to_cart_btn = AnimatedButton("Añadir al Carrito")
-        self.add_to_cart_btn.setFixedHeight(40)
-        layout.addWidget(self.add_to_cart_btn)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
 
-        self.apply_theme(current_theme)
-        self.mouseDoubleClickEvent = self.show_product_details
+        card = self.card_rect(option.rect)
 
-    def show_product_details(self, event):
-        """Muestra detalles del producto"""
-        name, price, image_path, category, stock = self.product_data
-        dialog = QDialog(self)
-        dialog.setWindowTitle(f"Detalles de {name}")
-        dialog.setFixedSize(500, 600)
-        dialog.setStyleSheet(f"""
-            QDialog {{
-                background-color: {current_theme['background']};
-                border-radius: 20px;
-            }}
-        """)
+        # Sombra desde la nine-patch ya difuminada
+        if self.shadows:
+            shadow_cache.draw(painter, card.translated(self.SHADOW_OFFSET), self.SHADOW_BLUR, 20, self.SHADOW_COLOR)
 
-        layout = QVBoxLayout(dialog)
-        layout.setSpacing(20)
-        layout.setContentsMargins(30, 30, 30, 30)
+        # Fondo y borde de la tarjeta
+        painter.setBrush(QColor(theme['card_bg']))
+        if hovered:
+            painter.setPen(QPen(QColor(theme['primary']), 2))
+        else:
+            painter.setPen(QPen(QColor(theme['border']), 1))
+        painter.drawRoundedRect(card.adjusted(0.5, 0.5, -0.5, -0.5), 20, 20)
 
-        # Imagen grande
-        img_container = ModernCard()
-        img_container.setFixedSize(300, 200)
-        img_layout = QVBoxLayout(img_container)
-        
-        img_lbl = QLabel()
-        pixmap = QPixmap(image_path) if os.path.exists(image_path) else QPixmap(DEFAULT_IMAGE_PATH)
-        if pixmap.isNull():
-            pixmap = QPixmap(280, 180)
-            pixmap.fill(QColor("#FEFAE0"))
-        img_lbl.setPixmap(pixmap.scaled(280, 180, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        img_lbl.setAlignment(Qt.AlignCenter)
-        img_layout.addWidget(img_lbl)
-        
-        layout.addWidget(img_container, alignment=Qt.AlignCenter)
-
-        # Información detallada
-        info_card = ModernCard()
-        info_layout = QVBoxLayout(info_card)
-        info_layout.setContentsMargins(25, 20, 25, 20)
-        
-        name_lbl = QLabel(f"<h2 style='color: {current_theme['primary']};'>{name}</h2>")
-        name_lbl.setAlignment(Qt.AlignCenter)
-        info_layout.addWidget(name_lbl)
-
-        details_lbl = QLabel(f"""
-            <div style='font-size: 16px; line-height: 1.6;'>
-                <p><b>Categoría:</b> <span style='color: {current_theme['secondary']};'>{category}</span></p>
-                <p><b>Precio:</b> <span style='color: {current_theme['accent']}; font-size: 18px;'>${price:.2f}</span></p>
-                <p><b>Stock Disponible:</b> <span style='color: {current_theme['success']};'>{stock} unidades</span></p>
-                <p><b>Descripción:</b> Delicioso {name.lower()} preparado con ingredientes frescos y de la más alta calidad.</p>
-            </div>
-        """)
-        details_lbl.setWordWrap(True)
-        details_lbl.setStyleSheet(f"color: {current_theme['text']};")
-        info_layout.addWidget(details_lbl)
-        
-        layout.addWidget(info_card)
+        # Marco de la imagen
+        image_frame = QRectF(card.x() + 15, card.y() + 15, 190, 160)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#F8F9FA"))
+        painter.drawRoundedRect(image_frame, 15, 15)
 
-        # Botón cerrar
-        close_btn = AnimatedButton("Cerrar")
-        close_btn.setFixedHeight(45)
-        close_btn.clicked.connect(dialog.accept)
-        layout.addWidget(close_btn)
+        pixmap = thumbnail_loader.request(image_path, 180, 150, owner=option.widget)
+        painter.drawPixmap(int(image_frame.center().x() - pixmap.width() / 2),
+                           int(image_frame.center().y() - pixmap.height() / 2), pixmap)
 
-        img_container.apply_theme(current_theme)
-        info_card.apply_theme(current_theme)
-        dialog.exec_()
+        # Nombre del producto
+        name_font = QFont(option.font)
+        name_font.setPixelSize(16)
+        name_font.setBold(True)
+        painter.setFont(name_font)
+        painter.setPen(QColor(theme['text']))
+        name_rect = QRectF(card.x() + 20, card.y() + 187, 180, 38)
+        elided = painter.fontMetrics().elidedText(name, Qt.ElideRight, int(name_rect.width()) * 2)
+        painter.drawText(name_rect, Qt.AlignCenter | Qt.TextWordWrap, elided)
 
-    def apply_theme(self, theme):
-        """Aplica el tema a la tarjeta"""
-        super().apply_theme(theme)
-        
-        self.name_label.setStyleSheet(f"""
-            font-weight: bold; 
-            color: {theme['text']}; 
-            font-size: 16px;
-            padding: 5px;
-        """)
-        self.price_label.setStyleSheet(f"""
-            color: {theme['accent']}; 
-            font-weight: 700; 
-            font-size: 18px;
-        """)
-        self.stock_label.setStyleSheet(f"""
-            color: {theme['warning']}; 
-            font-style: italic; 
-            font-size: 13px;
-        """)
-        self.add_to_cart_btn.setStyleSheet(f"""
-            QPushButton {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 {theme['gradient_start']}, stop:1 {theme['gradient_end']});
-                color: white;
-                font-weight: 700;
-                border-radius: 20px;
-                padding: 10px 15px;
-                font-size: 14px;
-                border: none;
-            }}
-            QPushButton:hover {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 {theme['button_hover']}, stop:1 {theme['gradient_end']});
-                transform: translateY(-2px);
-            }}
-            QPushButton:pressed {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 {theme['button_pressed']}, stop:1 {theme['gradient_end']});
-            }}
-        """)
+        # Precio y stock
+        details_rect = QRectF(card.x() + 15, card.y() + 229, 190, 24)
+        price_font = QFont(option.font)
+        price_font.setPixelSize(18)
+        price_font.setWeight(QFont.Bold)
+        painter.setFont(price_font)
+        painter.setPen(QColor(theme['accent']))
+        painter.drawText(details_rect, Qt.AlignLeft | Qt.AlignVCenter, f"${price:.2f}")
+
+        stock_font = QFont(option.font)
+        stock_font.setPixelSize(13)
+        stock_font.setItalic(True)
+        painter.setFont(stock_font)
+        painter.setPen(QColor(theme['warning']))
+        painter.drawText(details_rect, Qt.AlignRight | Qt.AlignVCenter, f"Stock: {stock}")
+
+        # Botón "Añadir al Carrito"
+        button_rect = self.button_rect(option.rect)
+        gradient = QLinearGradient(button_rect.topLeft(), button_rect.bottomLeft())
+        gradient.setColorAt(0, QColor(theme['button_hover'] if hovered else theme['gradient_start']))
+        gradient.setColorAt(1, QColor(theme['gradient_end']))
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QBrush(gradient))
+        painter.drawRoundedRect(button_rect, 20, 20)
+
+        button_font = QFont(option.font)
+        button_font.setPixelSize(14)
+        button_font.setBold(True)
+        painter.setFont(button_font)
+        painter.setPen(QColor("white"))
+        painter.drawText(button_rect, Qt.AlignCenter, "Añadir al Carrito")
+
+        painter.restore()
 
 class OrdersView(QWidget):
     """Vista de órdenes y productos"""
+    # Cambió el número de tarjetas de la cuadrícula (filtro, altas o bajas): afecta a shadowed_items
+    shadowed_items_changed = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.current_theme = current_theme
+        set_theme_role(self, "view")
         layout = QVBoxLayout(self)
         layout.setContentsMargins(30, 30, 30, 30)
         layout.setSpacing(25)
@@ -472,28 +2915,84 @@ class OrdersView(QWidget):
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("🔍 Buscar productos por nombre...")
         self.search_input.setFixedHeight(45)
-        self.search_input.textChanged.connect(self.update_product_grid)
+        set_theme_role(self.search_input, "search")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.update_product_grid)
+        self.search_input.textChanged.connect(self.search_timer.start)
         controls_layout.addWidget(self.search_input)
 
         self.category_filter = QComboBox()
         self.category_filter.addItems(["📋 Todas las Categorías", "🍜 Ramen", "🥤 Bebidas", "🍱 Otros"])
         self.category_filter.setFixedHeight(45)
+        set_theme_role(self.category_filter, "search")
         self.category_filter.currentTextChanged.connect(self.update_product_grid)
         controls_layout.addWidget(self.category_filter)
         
         layout.addWidget(controls_card)
 
-        # Grid de productos
-        self.grid = QGridLayout()
-        self.grid.setSpacing(25)
-        self.grid.setAlignment(Qt.AlignTop | Qt.AlignHCenter)
-
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-        scroll.setStyleSheet("""
-            QScrollArea {
+        # Carrito de la orden en curso: ID del producto -> cantidad
+        self.cart = OrderedDict()
+        cart_card = ModernCard()
+        cart_layout = QHBoxLayout(cart_card)
+        cart_layout.setContentsMargins(25, 15, 25, 15)
+
+        self.cart_label = QLabel()
+        self.cart_label.setStyleSheet("font-size: 16px; font-weight: 600;")
+        cart_layout.addWidget(self.cart_label, 1)
+
+        self.clear_cart_btn = AnimatedButton("🗑️ Vaciar", corner_radius=20)
+        self.clear_cart_btn.setFixedHeight(40)
+        set_theme_role(self.clear_cart_btn, "cart")
+        self.clear_cart_btn.clicked.connect(self.clear_cart)
+        cart_layout.addWidget(self.clear_cart_btn)
+
+        self.checkout_btn = AnimatedButton("💳 Cobrar", corner_radius=20)
+        self.checkout_btn.setFixedHeight(40)
+        set_theme_role(self.checkout_btn, "cart")
+        self.checkout_btn.clicked.connect(self.checkout)
+        cart_layout.addWidget(self.checkout_btn)
+
+        layout.addWidget(cart_card)
+        self.update_cart_label()
+
+        # Grid de productos virtualizado: sólo se pintan las tarjetas visibles
+        self._thumbnail_sweep = QTimer(self)
+        self._thumbnail_sweep.setSingleShot(True)
+        self._thumbnail_sweep.setInterval(150)
+
+        self.grid_model = ProductGridModel(self)
+        for signal in (self.grid_model.modelReset, self.grid_model.rowsInserted, self.grid_model.rowsRemoved):
+            signal.connect(self.shadowed_items_changed)
+        self.grid_delegate = ProductCardDelegate(self)
+
+        self.grid_view = QListView()
+        self.grid_view.setModel(self.grid_model)
+        self.grid_view.setItemDelegate(self.grid_delegate)
+        self.grid_view.setViewMode(QListView.IconMode)
+        self.grid_view.setFlow(QListView.LeftToRight)
+        self.grid_view.setWrapping(True)
+        self.grid_view.setResizeMode(QListView.Adjust)
+        self.grid_view.setMovement(QListView.Static)
+        self.grid_view.setUniformItemSizes(True)
+        self.grid_view.setLayoutMode(QListView.Batched)
+        self.grid_view.setBatchSize(500)
+        self.grid_view.setGridSize(self.grid_delegate.sizeHint(None, QModelIndex()))
+        self.grid_view.setSelectionMode(QListView.NoSelection)
+        self.grid_view.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.grid_view.verticalScrollBar().setSingleStep(30)
+        self.grid_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.grid_view.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self.grid_view.setMouseTracking(True)
+        self.grid_view.setFrameShape(QFrame.NoFrame)
+        self.grid_view.viewport().setCursor(QCursor(Qt.PointingHandCursor))
+        self.grid_view.verticalScrollBar().valueChanged.connect(self._thumbnail_sweep.start)
+        thumbnail_loader.thumbnail_ready.connect(lambda *args: self.grid_view.viewport().update())
+        self.grid_view.doubleClicked.connect(self._on_double_clicked)
+        self.grid_delegate.add_to_cart.connect(self.add_to_cart)
+        self.grid_view.setStyleSheet("""
+            QListView {
                 border: none;
                 background-color: transparent;
             }
@@ -512,25 +3011,18 @@ class OrdersView(QWidget):
                 background-color: #A0A0A0;
             }
         """)
-        
-        content = QWidget()
-        content.setLayout(self.grid)
-        scroll.setWidget(content)
-        layout.addWidget(scroll)
+        layout.addWidget(self.grid_view)
+        self._thumbnail_sweep.timeout.connect(lambda: thumbnail_loader.sweep(self.grid_view))
 
-        self.update_product_grid()
-        self.apply_theme(current_theme)
-        controls_card.apply_theme(current_theme)
-        header_card.apply_theme(current_theme)
+        # Los cambios del catálogo se aplican tarjeta a tarjeta
+        self._catalog_version = -1
+        catalog_events.product_added.connect(self._on_product_added)
+        catalog_events.product_updated.connect(self._on_product_updated)
+        catalog_events.product_removed.connect(self._on_product_removed)
 
+        self.update_product_grid()
     def update_product_grid(self):
         """Actualiza la cuadrícula de productos"""
-        # Limpiar grid
-        for i in reversed(range(self.grid.count())):
-            widget_to_remove = self.grid.itemAt(i).widget()
-            if widget_to_remove:
-                widget_to_remove.setParent(None)
-
         search = self.search_input.text().lower()
         cat = self.category_filter.currentText()
         
@@ -544,79 +3036,275 @@ class OrdersView(QWidget):
         
         cat = category_map.get(cat, cat)
 
-        row = col = 0
-        for product in products:
-            name, price, img, category, stock = product
-            
-            category_match = (cat == "Todas las Categorías" or category == cat)
-            search_match = (not search or search in name.lower())
+        matches = search_product_ids(search, None if cat == "Todas las Categorías" else cat)
+
+        # Las miniaturas pendientes de tarjetas filtradas ya no se necesitan
+        thumbnail_loader.cancel(self.grid_view)
+        self.grid_model.set_product_ids(matches)
+        self._catalog_version = catalog_events.version
+
+    def refresh_if_stale(self):
+        """Actualiza la cuadrícula sólo si el catálogo cambió desde la última vez"""
+        if self._catalog_version != catalog_events.version:
+            self.update_product_grid()
+
+    def shadowed_items(self):
+        """Tarjetas de la cuadrícula que pueden estar en pantalla a la vez"""
+        grid = self.grid_view.gridSize()
+        viewport = self.grid_view.viewport().size()
+        columns = max(1, viewport.width() // grid.width())
+        rows = viewport.height() // grid.height() + 1
+        return min(columns * rows, self.grid_model.rowCount())
+
+    def set_item_shadows(self, enabled):
+        if self.grid_delegate.shadows != enabled:
+            self.grid_delegate.shadows = enabled
+            self.grid_view.viewport().update()
+
+    def _is_filtered(self):
+        return bool(self.search_input.text()) or self.category_filter.currentIndex() != 0
+
+    def _mark_current(self):
+        # Con una búsqueda pendiente, ella dejará la cuadrícula al día
+        if not self.search_timer.isActive():
+            self._catalog_version = catalog_events.version
+
+    def _on_product_added(self, product_id):
+        if self._is_filtered():
+            self.search_timer.start()
+        else:
+            self.grid_model.append_product(product_id)
+            self._mark_current()
+
+    def _on_product_updated(self, product_id):
+        if self._is_filtered():
+            # El producto editado puede entrar o salir del resultado
+            self.search_timer.start()
+        else:
+            self.grid_model.refresh_product(product_id)
+            self._mark_current()
+        if product_id in self.cart:
+            self.update_cart_label()
+
+    def _on_product_removed(self, product_id):
+        self.grid_model.remove_product(product_id)
+        self._mark_current()
+        if self.cart.pop(product_id, None) is not None:
+            self.update_cart_label()
+
+    def _on_double_clicked(self, index):
+        # El doble clic sobre el botón ya añadió el producto al carrito
+        pos = self.grid_view.viewport().mapFromGlobal(QCursor.pos())
+        if not self.grid_delegate.button_rect(self.grid_view.visualRect(index)).contains(QPointF(pos)):
+            show_product_details_dialog(index.data(ProductRole), self)
+
+    def add_to_cart(self, product_id):
+        """Añade una unidad del producto a la orden en curso"""
+        product = product_repository.get(product_id)
+        if product is None:
+            return
+        quantity = self.cart.get(product_id, 0) + 1
+        if quantity > product.stock:
+            QMessageBox.warning(self, "Sin Stock", f"No queda más stock de '{product.name}'.")
+            return
+        self.cart[product_id] = quantity
+        self.update_cart_label()
+
+    def clear_cart(self):
+        self.cart.clear()
+        self.update_cart_label()
+
+    def update_cart_label(self):
+        """Resume el carrito: unidades y total"""
+        units, total = 0, 0.0
+        for product_id, quantity in self.cart.items():
+            product = product_repository.get(product_id)
+            if product is not None:
+                units += quantity
+                total += quantity * product.price
+        if units:
+            self.cart_label.setText(f"🛒 Carrito: {units} artículo{'s' if units != 1 else ''} · ${total:,.2f}")
+        else:
+            self.cart_label.setText("🛒 Carrito vacío")
+        self.clear_cart_btn.setEnabled(bool(units))
+        self.checkout_btn.setEnabled(bool(units))
+
+    def checkout(self):
+        """Registra la orden en el libro de ventas y descuenta el stock vendido"""
+        items = []
+        for product_id, quantity in self.cart.items():
+            product = product_repository.get(product_id)
+            if product is None:
+                continue
+            if quantity > product.stock:
+                QMessageBox.warning(self, "Sin Stock",
+                                    f"Sólo quedan {product.stock} unidades de '{product.name}'.")
+                return
+            items.append((product_id, product, quantity))
+        if not items:
+            self.clear_cart()
+            return
+
+        order_id = order_ledger.record(items)
+        if order_id is None:
+            QMessageBox.critical(self, "Error", "No se pudo registrar la venta.")
+            return
+        for product_id, product, quantity in items:
+            name, price, image_path, category, stock = product
+            product_repository.upsert(Product(name, price, image_path, category, stock - quantity), product_id)
 
-            if category_match and search_match:
-                card = ProductCard(product)
-                self.grid.addWidget(card, row, col)
-                col += 1
-                if col >= 4:
-                    col = 0
-                    row += 1
+        units = sum(quantity for _, _, quantity in items)
+        total = sum(quantity * product.price for _, product, quantity in items)
+        self.clear_cart()
+        QMessageBox.information(self, "Venta Registrada",
+                                f"Orden #{order_id}: {units} artículo{'s' if units != 1 else ''} por ${total:,.2f}.")
 
     def apply_theme(self, theme):
-        """Aplica el tema a la vista"""
+        """Aplica el tema a lo que no cubre la hoja de estilos"""
         self.current_theme = theme
-        self.setStyleSheet(f"background-color: {theme['background']};")
-        
-        # Estilos de controles
-        self.search_input.setStyleSheet(f"""
-            QLineEdit {{
-                border: 2px solid {theme['border']};
-                border-radius: 22px;
-                padding: 12px 20px;
-                font-size: 16px;
-                color: {theme['text']};
-                background-color: {theme['card_bg']};
-            }}
-            QLineEdit:focus {{
-                border: 2px solid {theme['primary']};
-                background-color: {theme['card_bg']};
-            }}
-        """)
-        
-        self.category_filter.setStyleSheet(f"""
-            QComboBox {{
-                border: 2px solid {theme['border']};
-                border-radius: 22px;
-                padding: 12px 20px;
-                font-size: 16px;
-                color: {theme['text']};
-                background-color: {theme['card_bg']};
-                min-width: 200px;
-            }}
-            QComboBox:hover {{
-                border: 2px solid {theme['primary']};
-            }}
-            QComboBox::drop-down {{
-                border: none;
-                width: 30px;
-            }}
-            QComboBox::down-arrow {{
-                image: none;
-                border-left: 5px solid transparent;
-                border-right: 5px solid transparent;
-                border-top: 5px solid {theme['text']};
-                margin-right: 10px;
-            }}
-        """)
-        
-        # Actualizar tarjetas existentes
-        for i in range(self.grid.count()):
-            widget = self.grid.itemAt(i).widget()
-            if isinstance(widget, ProductCard):
-                widget.apply_theme(theme)
+        # Las tarjetas se pintan con el tema del delegado
+        self.grid_delegate.set_theme(theme)
+        self.grid_view.viewport().update()
+
+# Rol con el valor crudo usado para ordenar la tabla de inventario
+SortRole = Qt.UserRole + 2
+
+class ProductTableModel(QAbstractTableModel):
+    """Modelo de tabla sobre el repositorio de productos; cada fila guarda el ID del producto"""
+    HEADERS = ["Imagen", "Producto", "Categoría", "Precio", "Stock"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._repository = None
+        self._ids = array("q")
+        self._row_by_id = {}
+        self._name_keys = []
+
+    def set_repository(self, repository):
+        """Carga las filas del repositorio y precalcula las claves de nombre"""
+        self.beginResetModel()
+        self._repository = repository
+        self._ids = array("q")
+        self._row_by_id = {}
+        self._name_keys = []
+        for product_id, name in repository.names():
+            self._row_by_id[product_id] = len(self._ids)
+            self._ids.append(product_id)
+            self._name_keys.append(name.lower())
+        self.endResetModel()
+
+    def product_id_at(self, row):
+        return self._ids[row]
+
+    def _row_of(self, product_id):
+        return self._row_by_id.get(product_id)
+
+    def insert_product(self, product_id):
+        row = len(self._ids)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._ids.append(product_id)
+        self._row_by_id[product_id] = row
+        self._name_keys.append(self._repository.get(product_id).name.lower())
+        self.endInsertRows()
+
+    def refresh_product(self, product_id):
+        """Actualiza la fila de un producto editado"""
+        row = self._row_of(product_id)
+        if row is not None:
+            self._name_keys[row] = self._repository.get(product_id).name.lower()
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+    def remove_product(self, product_id):
+        row = self._row_of(product_id)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._ids[row]
+            del self._name_keys[row]
+            del self._row_by_id[product_id]
+            # Las filas siguientes suben una posición
+            for moved_id in itertools.islice(self._ids, row, None):
+                self._row_by_id[moved_id] -= 1
+            self.endRemoveRows()
+
+    def product_at(self, row):
+        return self._repository.get(self._ids[row])
+
+    def name_key(self, row):
+        return self._name_keys[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._ids):
+            return None
+        product = self.product_at(index.row())
+        if product is None:
+            return None
+        name, price, img_path, category, stock = product
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 1:
+                return name
+            if column == 2:
+                return category
+            if column == 3:
+                return f"${price:.2f}"
+            if column == 4:
+                return str(stock)
+        elif role == Qt.DecorationRole and column == 0:
+            return thumbnail_loader.request(img_path, 80, 80, owner=self)
+        elif role == SortRole:
+            return (name.lower(), name.lower(), category.lower(), price, stock)[column]
+        elif role == ProductRole:
+            return product
+        return None
+
+class ProductFilterProxyModel(QSortFilterProxyModel):
+    """Filtro por nombre o categoría y ordenación de la tabla de inventario"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._accepted_names = None
+        self.setSortRole(SortRole)
+
+    def set_accepted_names(self, names):
+        """Muestra sólo los productos cuyo nombre (en minúsculas) está en names; None muestra todos"""
+        self._accepted_names = names
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self._accepted_names is None:
+            return True
+        return self.sourceModel().name_key(source_row) in self._accepted_names
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """Centra la miniatura del producto en su celda"""
+    def paint(self, painter, option, index):
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        pixmap = index.data(Qt.DecorationRole)
+        # El estilo pinta fondo y selección; la miniatura se dibuja centrada
+        opt.features &= ~QStyleOptionViewItem.HasDecoration
+        opt.icon = QIcon()
+        style = opt.widget.style() if opt.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, opt, painter, opt.widget)
+        if pixmap is not None and not pixmap.isNull():
+            painter.drawPixmap(option.rect.center().x() - pixmap.width() // 2 + 1,
+                               option.rect.center().y() - pixmap.height() // 2 + 1, pixmap)
 
 class InventoryView(QWidget):
     """Vista de inventario"""
     def __init__(self):
         super().__init__()
-        self.current_theme = current_theme
+        set_theme_role(self, "view")
         layout = QVBoxLayout(self)
         layout.setContentsMargins(30, 30, 30, 30)
         layout.setSpacing(25)
@@ -646,7 +3334,12 @@ class InventoryView(QWidget):
         self.inventory_search = QLineEdit()
         self.inventory_search.setPlaceholderText("🔍 Buscar producto por nombre o categoría...")
         self.inventory_search.setFixedHeight(45)
-        self.inventory_search.textChanged.connect(self.update_inventory_table)
+        set_theme_role(self.inventory_search, "search")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_inventory_table)
+        self.inventory_search.textChanged.connect(self.search_timer.start)
         search_layout.addWidget(self.inventory_search)
         
         layout.addWidget(search_card)
@@ -656,14 +3349,33 @@ class InventoryView(QWidget):
         table_layout = QVBoxLayout(table_card)
         table_layout.setContentsMargins(25, 25, 25, 25)
         
-        self.inventory_table = QTableWidget()
-        self.inventory_table.setColumnCount(5)
-        self.inventory_table.setHorizontalHeaderLabels(["Imagen", "Producto", "Categoría", "Precio", "Stock"])
+        self.table_model = ProductTableModel(self)
+        self.table_proxy = ProductFilterProxyModel(self)
+        self.table_proxy.setSourceModel(self.table_model)
+
+        self.inventory_table = QTableView()
+        self.inventory_table.setObjectName("inventoryTable")
+        self.inventory_table.setModel(self.table_proxy)
+        self.inventory_table.setItemDelegateForColumn(0, ThumbnailDelegate(self.inventory_table))
+        self.inventory_table.setIconSize(QSize(80, 80))
         self.inventory_table.verticalHeader().setVisible(False)
-        self.inventory_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.inventory_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.inventory_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.inventory_table.verticalHeader().setDefaultSectionSize(90)
+        self.inventory_table.setSelectionBehavior(QTableView.SelectRows)
+        self.inventory_table.setSelectionMode(QTableView.SingleSelection)
+        self.inventory_table.setEditTriggers(QTableView.NoEditTriggers)
         self.inventory_table.setColumnWidth(0, 100)
         self.inventory_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # Sin columna de orden inicial: se conserva el orden del catálogo
+        self.inventory_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.inventory_table.setSortingEnabled(True)
+        thumbnail_loader.thumbnail_ready.connect(lambda *args: self.inventory_table.viewport().update())
+
+        self._thumbnail_sweep = QTimer(self)
+        self._thumbnail_sweep.setSingleShot(True)
+        self._thumbnail_sweep.setInterval(150)
+        self._thumbnail_sweep.timeout.connect(lambda: thumbnail_loader.sweep(self.table_model))
+        self.inventory_table.verticalScrollBar().valueChanged.connect(self._thumbnail_sweep.start)
         self.inventory_table.setAlternatingRowColors(True)
         self.inventory_table.setMinimumHeight(400)
         table_layout.addWidget(self.inventory_table)
@@ -688,38 +3400,61 @@ class InventoryView(QWidget):
         
         layout.addWidget(buttons_card)
 
-        self.update_inventory_table()
-        self.apply_theme(current_theme)
-        header_card.apply_theme(current_theme)
-        search_card.apply_theme(current_theme)
-        table_card.apply_theme(current_theme)
-        buttons_card.apply_theme(current_theme)
+        # Los cambios del catálogo se aplican fila a fila
+        self._catalog_version = -1
+        catalog_events.product_added.connect(self._on_product_added)
+        catalog_events.product_updated.connect(self._on_product_updated)
+        catalog_events.product_removed.connect(self._on_product_removed)
 
+        self.update_inventory_table()
     def update_inventory_table(self):
         """Actualiza la tabla de inventario"""
-        search_text = self.inventory_search.text().lower()
-        filtered_products = [p for p in products if search_text in p[0].lower() or search_text in p[3].lower()]
-
-        self.inventory_table.setRowCount(len(filtered_products))
-        for r, (name, price, img_path, category, stock) in enumerate(filtered_products):
-            # Imagen
-            lbl = QLabel()
-            pm = QPixmap(img_path) if os.path.exists(img_path) else QPixmap(DEFAULT_IMAGE_PATH)
-            if pm.isNull():
-                pm = QPixmap(80, 80)
-                pm.fill(QColor("#FEFAE0"))
-            lbl.setPixmap(pm.scaled(80, 80, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            lbl.setAlignment(Qt.AlignCenter)
-            lbl.setStyleSheet("padding: 5px;")
-            self.inventory_table.setCellWidget(r, 0, lbl)
-            
-            # Datos
-            self.inventory_table.setItem(r, 1, QTableWidgetItem(name))
-            self.inventory_table.setItem(r, 2, QTableWidgetItem(category))
-            self.inventory_table.setItem(r, 3, QTableWidgetItem(f"${price:.2f}"))
-            self.inventory_table.setItem(r, 4, QTableWidgetItem(str(stock)))
-        
-        self.inventory_table.resizeRowsToContents()
+        thumbnail_loader.cancel(self.table_model)
+        self.table_model.set_repository(product_repository)
+        self._catalog_version = catalog_events.version
+        if self.inventory_search.text():
+            self.filter_inventory_table()
+
+    def refresh_if_stale(self):
+        """Recarga la tabla sólo si el catálogo cambió desde la última vez"""
+        if self._catalog_version != catalog_events.version:
+            self.update_inventory_table()
+
+    def _on_product_added(self, product_id):
+        self.table_model.insert_product(product_id)
+        self._after_catalog_change()
+
+    def _on_product_updated(self, product_id):
+        self.table_model.refresh_product(product_id)
+        self._after_catalog_change()
+
+    def _on_product_removed(self, product_id):
+        self.table_model.remove_product(product_id)
+        self._catalog_version = catalog_events.version
+
+    def _after_catalog_change(self):
+        # El filtro guarda los nombres aceptados: se recalcula para incluir el cambio
+        if self.inventory_search.text():
+            self.filter_inventory_table()
+        self._catalog_version = catalog_events.version
+
+    def filter_inventory_table(self):
+        """Filtra la tabla sin reconstruir filas ni widgets"""
+        thumbnail_loader.cancel(self.table_model)
+        text = self.inventory_search.text()
+        if text:
+            matches = search_products(text, fields=("name", "category"))
+            self.table_proxy.set_accepted_names({p.name.lower() for p in matches})
+        else:
+            self.table_proxy.set_accepted_names(None)
+
+    def selected_product_id(self):
+        """Devuelve el ID del producto seleccionado en la tabla o None"""
+        selected_rows = self.inventory_table.selectionModel().selectedRows()
+        if not selected_rows:
+            return None
+        source_index = self.table_proxy.mapToSource(selected_rows[0])
+        return self.table_model.product_id_at(source_index.row())
 
     def add_product(self):
         """Añadir nuevo producto"""
@@ -727,32 +3462,23 @@ class InventoryView(QWidget):
 
     def edit_product(self):
         """Editar producto seleccionado"""
-        selected_rows = self.inventory_table.selectedIndexes()
-        if not selected_rows:
+        product_id = self.selected_product_id()
+        if product_id is None:
             QMessageBox.warning(self, "Editar Producto", "Por favor, selecciona un producto para editar.")
             return
 
-        row = selected_rows[0].row()
-        product_name_in_table = self.inventory_table.item(row, 1).text()
-        
-        original_product = next((p for p in products if p[0] == product_name_in_table), None)
-        
-        if original_product:
-            self._show_product_dialog("Editar Producto", original_product)
+        if product_repository.get(product_id) is not None:
+            self._show_product_dialog("Editar Producto", product_id)
         else:
             QMessageBox.critical(self, "Error", "No se pudo encontrar el producto original.")
 
-    def _show_product_dialog(self, title, product_data=None):
+    def _show_product_dialog(self, title, product_id=None):
         """Muestra diálogo para añadir/editar producto con diseño mejorado"""
+        product_data = product_repository.get(product_id) if product_id is not None else None
         dialog = QDialog(self)
         dialog.setWindowTitle(title)
         dialog.setFixedSize(600, 500)
-        dialog.setStyleSheet(f"""
-            QDialog {{
-                background-color: {current_theme['background']};
-                border-radius: 20px;
-            }}
-        """)
+        set_theme_role(dialog, "dialog")
 
         layout = QVBoxLayout(dialog)
         layout.setContentsMargins(40, 40, 40, 40)
@@ -761,12 +3487,7 @@ class InventoryView(QWidget):
         # Título del diálogo
         title_label = QLabel(title)
         title_label.setAlignment(Qt.AlignCenter)
-        title_label.setStyleSheet(f"""
-            font-size: 24px; 
-            font-weight: bold; 
-            color: {current_theme['primary']};
-            margin-bottom: 20px;
-        """)
+        set_theme_role(title_label, "dialogTitle")
         layout.addWidget(title_label)
 
         # Formulario en tarjeta
@@ -790,35 +3511,14 @@ class InventoryView(QWidget):
                 combo = QComboBox()
                 combo.addItems(categories)
                 combo.setFixedHeight(45)
-                combo.setStyleSheet(f"""
-                    QComboBox {{
-                        border: 2px solid {current_theme['border']};
-                        border-radius: 10px;
-                        padding: 10px 15px;
-                        font-size: 14px;
-                        color: {current_theme['text']};
-                        background-color: {current_theme['card_bg']};
-                    }}
-                """)
+                set_theme_role(combo, "field")
                 form_layout.addRow(f"{label_text}:", combo)
                 fields[key] = combo
             else:
                 le = QLineEdit()
                 le.setPlaceholderText(f"Ingrese {label_text.lower()}")
                 le.setFixedHeight(45)
-                le.setStyleSheet(f"""
-                    QLineEdit {{
-                        border: 2px solid {current_theme['border']};
-                        border-radius: 10px;
-                        padding: 10px 15px;
-                        font-size: 14px;
-                        color: {current_theme['text']};
-                        background-color: {current_theme['card_bg']};
-                    }}
-                    QLineEdit:focus {{
-                        border: 2px solid {current_theme['primary']};
-                    }}
-                """)
+                set_theme_role(le, "field")
                 form_layout.addRow(f"{label_text}:", le)
                 fields[key] = le
 
@@ -837,59 +3537,23 @@ class InventoryView(QWidget):
         button_layout = QHBoxLayout(button_card)
         button_layout.setContentsMargins(20, 15, 20, 15)
         
-        btn_cancel = AnimatedButton("Cancelar")
+        btn_cancel = AnimatedButton("Cancelar", corner_radius=25)
         btn_cancel.setFixedHeight(50)
+        set_theme_role(btn_cancel, "secondary")
         btn_cancel.clicked.connect(dialog.reject)
         
-        btn_save = AnimatedButton("Guardar Producto")
+        btn_save = AnimatedButton("Guardar Producto", corner_radius=25)
         btn_save.setFixedHeight(50)
-        btn_save.clicked.connect(lambda: self._save_product_dialog(dialog, fields, product_data))
+        set_theme_role(btn_save, "primary")
+        btn_save.clicked.connect(lambda: self._save_product_dialog(dialog, fields, product_id))
 
         button_layout.addWidget(btn_cancel)
         button_layout.addWidget(btn_save)
         layout.addWidget(button_card)
 
-        # Aplicar temas
-        form_card.apply_theme(current_theme)
-        button_card.apply_theme(current_theme)
-        
-        # Estilos de botones
-        btn_cancel.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {current_theme['border']};
-                color: {current_theme['text']};
-                font-weight: 600;
-                border-radius: 25px;
-                padding: 15px 30px;
-                font-size: 16px;
-                border: none;
-            }}
-            QPushButton:hover {{
-                background-color: {current_theme['grey_text']};
-                color: white;
-            }}
-        """)
-        
-        btn_save.setStyleSheet(f"""
-            QPushButton {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 {current_theme['gradient_start']}, stop:1 {current_theme['gradient_end']});
-                color: white;
-                font-weight: 600;
-                border-radius: 25px;
-                padding: 15px 30px;
-                font-size: 16px;
-                border: none;
-            }}
-            QPushButton:hover {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 {current_theme['button_hover']}, stop:1 {current_theme['gradient_end']});
-            }}
-        """)
-
         dialog.exec_()
 
-    def _save_product_dialog(self, dialog, fields, original_product_data):
+    def _save_product_dialog(self, dialog, fields, product_id):
         """Guarda el producto del diálogo"""
         name = fields["name"].text().strip()
         category = fields["category"].currentText().strip()
@@ -917,105 +3581,308 @@ class InventoryView(QWidget):
             QMessageBox.warning(dialog, "Error de Formato", "El stock debe ser un número entero válido.")
             return
 
-        new_product = (name, price, DEFAULT_IMAGE_PATH, category, stock)
+        new_product = Product(name, price, DEFAULT_IMAGE_PATH, category, stock)
 
-        global products
-        if original_product_data:
+        owner = product_repository.find(name)
+        if owner is not None and owner != product_id:
+            QMessageBox.warning(dialog, "Producto Existente", "Ya existe un producto con este nombre.")
+            return
+
+        if product_id is not None:
             # Edición
-            try:
-                original_name = original_product_data[0]
-                idx = next(i for i, p in enumerate(products) if p[0] == original_name)
-                products[idx] = new_product
-                QMessageBox.information(dialog, "Éxito", f"Producto '{name}' actualizado correctamente.")
-            except StopIteration:
+            original_product = product_repository.get(product_id)
+            if original_product is None:
                 QMessageBox.critical(dialog, "Error", "No se pudo encontrar el producto original.")
                 return
+            product_repository.upsert(new_product, product_id)
+            self._release_image(original_product.image_path)
+            QMessageBox.information(dialog, "Éxito", f"Producto '{name}' actualizado correctamente.")
         else:
             # Nuevo producto
-            if any(p[0].lower() == name.lower() for p in products):
-                QMessageBox.warning(dialog, "Producto Existente", "Ya existe un producto con este nombre.")
-                return
-            products.append(new_product)
+            product_repository.upsert(new_product)
             QMessageBox.information(dialog, "Éxito", f"Producto '{name}' añadido correctamente.")
         
-        save_products(products)
-        self.update_inventory_table()
         dialog.accept()
 
+    def _release_image(self, image_path):
+        """Borra las miniaturas de una imagen que ya no usa ningún producto"""
+        if image_path == DEFAULT_IMAGE_PATH or product_repository.image_in_use(image_path):
+            return
+        image_cache.invalidate(image_path)
+        thumbnail_disk_cache.remove(image_path)
+
     def remove_product(self):
         """Eliminar producto seleccionado"""
-        selected_rows = self.inventory_table.selectedIndexes()
-        if not selected_rows:
+        product_id = self.selected_product_id()
+        selected_product = product_repository.get(product_id) if product_id is not None else None
+        if selected_product is None:
             QMessageBox.warning(self, "Eliminar Producto", "Por favor, selecciona un producto para eliminar.")
             return
 
-        row = selected_rows[0].row()
-        product_name_to_delete = self.inventory_table.item(row, 1).text()
+        product_name_to_delete = selected_product.name
 
         reply = QMessageBox.question(self, "Confirmar Eliminación",
                                      f"¿Estás seguro de que deseas eliminar '{product_name_to_delete}'?",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         
         if reply == QMessageBox.Yes:
-            global products
-            products = [p for p in products if p[0] != product_name_to_delete]
-            save_products(products)
-            self.update_inventory_table()
+            product_repository.delete(product_id)
+            self._release_image(selected_product.image_path)
             QMessageBox.information(self, "Eliminación Exitosa", f"Producto '{product_name_to_delete}' eliminado.")
 
-    def apply_theme(self, theme):
-        """Aplica el tema a la vista"""
-        self.current_theme = theme
-        self.setStyleSheet(f"background-color: {theme['background']};")
-        
-        self.inventory_search.setStyleSheet(f"""
-            QLineEdit {{
-                border: 2px solid {theme['border']};
-                border-radius: 22px;
-                padding: 12px 20px;
-                font-size: 16px;
-                color: {theme['text']};
-                background-color: {theme['card_bg']};
-            }}
-            QLineEdit:focus {{
-                border: 2px solid {theme['primary']};
-            }}
-        """)
-        
-        self.inventory_table.setStyleSheet(f"""
-            QTableWidget {{
-                background-color: {theme['card_bg']};
-                border: none;
-                border-radius: 15px;
-                gridline-color: {theme['border']};
-                color: {theme['text']};
-                font-size: 14px;
-                selection-background-color: {theme['selection_bg']};
-            }}
-            QHeaderView::section {{
-                background-color: {theme['header_bg']};
-                color: {theme['text']};
-                padding: 15px;
-                border: none;
-                border-bottom: 2px solid {theme['border']};
-                font-weight: bold;
-                font-size: 14px;
-            }}
-            QTableWidget::item {{
-                padding: 10px;
-                border-bottom: 1px solid {theme['border']};
-            }}
-            QTableWidget::item:selected {{
-                background-color: {theme['selection_bg']};
-                color: {theme['text']};
-            }}
-        """)
+class ChartCache:
+    """Gráficos ya dibujados, por (gráfico, versión de los datos, colores del tema, tamaño); LRU"""
+    def __init__(self, max_entries=CHART_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._pixmaps = OrderedDict()
+
+    def get(self, key):
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        self._pixmaps[key] = pixmap
+        self._pixmaps.move_to_end(key)
+        while len(self._pixmaps) > self.max_entries:
+            self._pixmaps.popitem(last=False)
+
+    def clear(self):
+        self._pixmaps.clear()
+
+chart_cache = ChartCache()
+
+class ChartTask(QRunnable):
+    """Dibuja un gráfico con Agg en el hilo de gráficos y devuelve la imagen RGBA"""
+    def __init__(self, renderer, key, plot, data, theme, width, height, ratio):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.renderer = renderer
+        self.key = key
+        self.plot = plot
+        self.data = data
+        self.theme = theme
+        self.size = (width, height, ratio)
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            return
+        width, height, ratio = self.size
+        try:
+            Figure, FigureCanvas = get_charting()
+            figure = Figure(figsize=(width / 100, height / 100), dpi=100 * ratio)
+            figure.patch.set_facecolor('none')
+            canvas = FigureCanvas(figure)
+            self.plot(figure, self.theme, self.data)
+            canvas.draw()
+            buffer = canvas.buffer_rgba()
+            rows, columns = buffer.shape[:2]
+            # copy(): la imagen deja de depender del búfer de matplotlib
+            image = QImage(bytes(buffer), columns, rows, 4 * columns, QImage.Format_RGBA8888).copy()
+        except Exception as e:
+            print(f"Error dibujando el gráfico {self.key[0]}: {e}")
+            image = QImage()
+        if not self.cancelled:
+            self.renderer._rendered.emit(self, image)
+
+class ChartRenderer(QObject):
+    """Dibujo de gráficos fuera del hilo de la interfaz.
+
+    Un solo hilo, porque matplotlib no admite dibujar varias figuras a la vez. Una
+    petición nueva de un gráfico cancela la anterior del mismo gráfico si no empezó.
+    """
+    chart_ready = pyqtSignal(object)
+    _rendered = pyqtSignal(object, QImage)
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._pending = {}  # clave -> ChartTask
+        self._rendered.connect(self._on_rendered)
+
+    def request(self, key, plot, data, theme, width, height, ratio):
+        """Pixmap en caché para key, o None mientras se dibuja (avisa con chart_ready)"""
+        pixmap = self.cache.get(key)
+        if pixmap is not None or key in self._pending:
+            return pixmap
+        for other in [k for k in self._pending if k[0] == key[0]]:
+            if self.pool.tryTake(self._pending[other]):
+                del self._pending[other]
+        task = ChartTask(self, key, plot, data, theme, width, height, ratio)
+        self._pending[key] = task
+        self.pool.start(task)
+        return None
+
+    def shutdown(self):
+        """Descarta la cola y espera al gráfico en curso"""
+        for task in self._pending.values():
+            task.cancelled = True
+        self.pool.clear()
+        self.pool.waitForDone()
+        self._pending.clear()
+
+    def _on_rendered(self, task, image):
+        if self._pending.get(task.key) is not task:
+            return
+        del self._pending[task.key]
+        if image.isNull():
+            return
+        # Los QPixmap sólo pueden crearse en el hilo de la interfaz
+        pixmap = QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(task.size[2])
+        self.cache.put(task.key, pixmap)
+        self.chart_ready.emit(task.key)
+
+chart_renderer = ChartRenderer(chart_cache)
+
+class AnalyticsTask(QRunnable):
+    """Calcula inventory_analytics en el hilo de analítica"""
+    def __init__(self, worker, version, snapshot):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.worker = worker
+        self.version = version
+        self.snapshot = snapshot
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            summary = inventory_analytics(self.snapshot)
+        except Exception as e:
+            print(f"Error calculando la analítica: {e}")
+            summary = None
+        self.snapshot = None  # Suelta las copias del catálogo
+        if not self.cancelled:
+            self.worker._computed.emit(self, summary)
+
+class AnalyticsWorker(QObject):
+    """Analítica del inventario fuera del hilo de la interfaz.
+
+    Sólo interesa el último resultado: una petición nueva descarta la pendiente y
+    hace que se ignore la que está en curso.
+    """
+    analytics_ready = pyqtSignal(object, object)  # versión, resumen
+    _computed = pyqtSignal(object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._task = None
+        self._computed.connect(self._on_computed)
+
+    def request(self, version, snapshot):
+        if self._task is not None:
+            self._task.cancelled = True
+            self.pool.tryTake(self._task)
+        self._task = AnalyticsTask(self, version, snapshot)
+        self.pool.start(self._task)
+
+    def shutdown(self):
+        """Descarta la petición pendiente y espera a la que está en curso"""
+        if self._task is not None:
+            self._task.cancelled = True
+        self.pool.clear()
+        self.pool.waitForDone()
+        self._task = None
+
+    def _on_computed(self, task, summary):
+        if task is not self._task:
+            return
+        self._task = None
+        if summary is not None:
+            self.analytics_ready.emit(task.version, summary)
+
+analytics_worker = AnalyticsWorker()
+
+class ChartView(QLabel):
+    """Muestra un gráfico de matplotlib dibujado por chart_renderer y guardado en chart_cache.
+
+    plot(figure, theme, data) dibuja el gráfico en el hilo de gráficos; sólo se llama
+    cuando no hay imagen para la versión de los datos, el tema y el tamaño actuales.
+    Mientras tanto se ve un marcador, o la imagen anterior si sólo cambió el tamaño.
+    """
+    THEME_KEYS = ("text", "primary", "secondary", "accent", "success")
+
+    def __init__(self, name, plot, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.plot = plot
+        self.version = None
+        self.data = None
+        self.theme = current_theme
+        self._wanted = None  # Clave de la imagen que debería verse
+        self._shown = None  # Clave de la imagen que se ve
+        self.setAlignment(Qt.AlignCenter)
+        self.setMinimumHeight(350)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setStyleSheet("background-color: transparent; border: none; color: #6C757D; font-size: 16px;")
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(100)
+        self._resize_timer.timeout.connect(self.refresh)
+        chart_renderer.chart_ready.connect(self._on_chart_ready)
+
+    def show_chart(self, version, theme, data):
+        self.version = version
+        self.theme = theme
+        self.data = data
+        self.refresh()
+
+    def refresh(self):
+        """Muestra la imagen en caché para el estado actual o pide dibujarla"""
+        if self.version is None or not self.isVisible():
+            return  # Se dibuja al mostrarse, ya con su tamaño final
+        ratio = self.devicePixelRatioF()
+        key = (self.name, self.version, tuple(self.theme[k] for k in self.THEME_KEYS),
+               self.width(), self.height(), ratio)
+        if key == self._shown:
+            return
+        self._wanted = key
+        pixmap = chart_renderer.request(key, self.plot, self.data, self.theme,
+                                        self.width(), self.height(), ratio)
+        if pixmap is not None:
+            self._show(key, pixmap)
+        elif self._shown is None or self._shown[:3] != key[:3]:
+            self._shown = None
+            self.setText("⏳ Generando gráfico...")
+
+    def _show(self, key, pixmap):
+        self._shown = key
+        self.setPixmap(pixmap)
+
+    # El tamaño lo decide el layout, no la imagen mostrada; las mismas pistas que FigureCanvas
+    def sizeHint(self):
+        return QSize(600, 500)
+
+    def minimumSizeHint(self):
+        return QSize(10, 10)
+
+    def _on_chart_ready(self, key):
+        if key == self._wanted:
+            self._show(key, chart_cache.get(key))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.isVisible():
+            self._resize_timer.start()
 
 class ReportsView(QWidget):
     """Vista de reportes con gráficos"""
     def __init__(self):
         super().__init__()
         self.current_theme = current_theme
+        set_theme_role(self, "view")
         layout = QVBoxLayout(self)
         layout.setContentsMargins(30, 30, 30, 30)
         layout.setSpacing(25)
@@ -1042,83 +3909,207 @@ class ReportsView(QWidget):
         stats_layout = QHBoxLayout(stats_container)
         stats_layout.setSpacing(20)
         
-        # Calcular estadísticas
-        total_products = len(products)
-        total_value = sum(p[1] * p[4] for p in products)  # precio * stock
-        low_stock = len([p for p in products if p[4] < 10])
-        avg_price = sum(p[1] for p in products) / len(products) if products else 0
-        
-        stats_cards = [
-            StatsCard("Total Productos", total_products, "📦", current_theme['primary']),
-            StatsCard("Valor Inventario", f"${total_value:,.0f}", "💰", current_theme['success']),
-            StatsCard("Stock Bajo", low_stock, "⚠️", current_theme['warning']),
-            StatsCard("Precio Promedio", f"${avg_price:.2f}", "📈", current_theme['secondary'])
-        ]
+        # Estadísticas del catálogo; se rellenan en update_stats
+        self.stats_cards = {
+            "total_products": StatsCard("Total Productos", 0, "📦", current_theme['primary']),
+            "total_value": StatsCard("Valor Inventario", "$0", "💰", current_theme['success']),
+            "low_stock": StatsCard("Stock Bajo", 0, "⚠️", current_theme['warning']),
+            "avg_price": StatsCard("Precio Promedio", "$0.00", "📈", current_theme['secondary'])
+        }
         
-        for card in stats_cards:
-            card.apply_theme(current_theme)
+        for card in self.stats_cards.values():
             stats_layout.addWidget(card)
         
         layout.addWidget(stats_container)
 
+        for signal in (catalog_events.product_added, catalog_events.product_updated,
+                       catalog_events.product_removed):
+            signal.connect(self._on_catalog_changed)
+        self.update_stats()
+
+        # Gráficos y analítica se desplazan juntos bajo las tarjetas
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        scroll.setStyleSheet("""
+            QScrollArea {
+                border: none;
+                background-color: transparent;
+            }
+        """)
+
+        scroll_content = QWidget()
+        scroll_layout = QVBoxLayout(scroll_content)
+        scroll_layout.setContentsMargins(0, 0, 0, 0)
+        scroll_layout.setSpacing(25)
+
         # Contenedor para gráficos
         charts_card = ModernCard()
         self.charts_layout = QGridLayout(charts_card)
         self.charts_layout.setContentsMargins(30, 30, 30, 30)
         self.charts_layout.setSpacing(30)
         
-        layout.addWidget(charts_card)
+        scroll_layout.addWidget(charts_card)
+
+        # Paneles de analítica del inventario
+        analytics_card = ModernCard()
+        analytics_layout = QGridLayout(analytics_card)
+        analytics_layout.setContentsMargins(30, 25, 30, 25)
+        analytics_layout.setHorizontalSpacing(30)
+        analytics_layout.setVerticalSpacing(20)
+
+        analytics_title = QLabel("🧮 Análisis del Inventario")
+        analytics_title.setStyleSheet("font-size: 22px; font-weight: bold;")
+        analytics_layout.addWidget(analytics_title, 0, 0, 1, 4)
+
+        self.analytics_panels = {}
+        panels = [
+            ("valuation", "💰 Valor por Categoría"),
+            ("abc", "🏷️ Clasificación ABC"),
+            ("cover", "📦 Días de Cobertura"),
+            ("dead", "🧊 Stock sin Movimiento"),
+        ]
+        for column, (key, title) in enumerate(panels):
+            panel_title = QLabel(title)
+            panel_title.setStyleSheet("font-size: 16px; font-weight: bold;")
+            panel_body = QLabel("⏳ Calculando...")
+            panel_body.setWordWrap(True)
+            panel_body.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+            panel_body.setStyleSheet("font-size: 14px; line-height: 150%;")
+            analytics_layout.addWidget(panel_title, 1, column)
+            analytics_layout.addWidget(panel_body, 2, column)
+            analytics_layout.setColumnStretch(column, 1)
+            self.analytics_panels[key] = panel_body
+
+        scroll_layout.addWidget(analytics_card)
+        scroll.setWidget(scroll_content)
+        layout.addWidget(scroll)
+
+        # La analítica recorre todo el catálogo: tras un cambio se espera a que cesen los siguientes
+        self._analytics_version = None
+        self._analytics_timer = QTimer(self)
+        self._analytics_timer.setSingleShot(True)
+        self._analytics_timer.setInterval(300)
+        self._analytics_timer.timeout.connect(self.update_analytics)
+        analytics_worker.analytics_ready.connect(self._on_analytics_ready)
+
+        # Los gráficos salen de los totales del libro de ventas
+        self._sales_version = -1
+        order_ledger.changed.connect(self._on_sales_changed)
 
-        # Datos simulados
-        self.months = ["Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago"]
-        self.ganancias = [12000, 18000, 15000, 21000, 19000, 23000, 26000, 28000]
-        self.categorias = ['Ramen', 'Bebidas', 'Postres', 'Otros']
-        self.ventas_categoria = [55000, 32000, 18000, 15000]
-        
         # Crear gráficos
-        self.canvas_monthly = self._create_chart_canvas()
-        self.canvas_category = self._create_chart_canvas()
+        self.chart_monthly = ChartView("monthly", self._plot_monthly)
+        self.chart_category = ChartView("category", self._plot_category)
 
-        self.charts_layout.addWidget(self.canvas_monthly, 0, 0)
-        self.charts_layout.addWidget(self.canvas_category, 0, 1)
+        self.charts_layout.addWidget(self.chart_monthly, 0, 0)
+        self.charts_layout.addWidget(self.chart_category, 0, 1)
 
         self.draw_plots()
-        self.apply_theme(current_theme)
-        header_card.apply_theme(current_theme)
-        charts_card.apply_theme(current_theme)
-
-    def _create_chart_canvas(self):
-        """Crea un canvas para gráficos"""
-        fig = Figure(figsize=(6, 5), dpi=100)
-        fig.patch.set_facecolor('none')
-        canvas = FigureCanvas(fig)
-        canvas.setMinimumHeight(350)
-        canvas.setStyleSheet("background-color: transparent;")
-        return canvas
+        self.update_analytics()
+
+    def update_stats(self):
+        """Muestra en las tarjetas los totales que mantiene el repositorio"""
+        stats = product_repository.kpis.stats()
+        self.stats_cards["total_products"].update_value(stats["total_products"])
+        self.stats_cards["total_value"].update_value(f"${stats['total_value']:,.0f}")
+        self.stats_cards["low_stock"].update_value(stats["low_stock"])
+        self.stats_cards["avg_price"].update_value(f"${stats['avg_price']:.2f}")
+
+    def refresh_if_stale(self):
+        """Pone al día gráficos y analítica si cambiaron; las tarjetas ya están al día"""
+        if self._sales_version != order_ledger.version:
+            self.draw_plots()
+        if self._analytics_version != (catalog_events.version, order_ledger.version):
+            self.update_analytics()
+
+    def _on_catalog_changed(self, product_id):
+        # Los totales no se recalculan: leerlos es O(1), también con la vista oculta
+        self.update_stats()
+        if self.isVisible():
+            self._analytics_timer.start()
+
+    def _on_sales_changed(self):
+        if self.isVisible():
+            self.draw_plots()
+            self._analytics_timer.start()
+
+    @profiled("Calculando analítica")
+    def update_analytics(self):
+        """Copia los datos de la analítica y la pide a analytics_worker; los paneles se rellenan al llegar"""
+        self._analytics_timer.stop()
+        self._analytics_version = (catalog_events.version, order_ledger.version)
+        if get_numpy() is None:
+            for panel in self.analytics_panels.values():
+                panel.setText("Requiere NumPy")
+            return
+        analytics_worker.request(self._analytics_version, analytics_snapshot(product_repository, order_ledger))
+
+    def _on_analytics_ready(self, version, summary):
+        if version != self._analytics_version:
+            return  # Ya se pidió una analítica más reciente
+
+        def named(pairs):
+            # Un producto borrado mientras se calculaba ya no aparece
+            products = ((product_repository.get(product_id), value) for product_id, value in pairs)
+            return [(product.name, value) for product, value in products if product is not None]
 
+        self.analytics_panels["valuation"].setText("\n".join(
+            f"{CATEGORY_LABELS.get(category, category)}: ${value:,.0f}"
+            for category, value in summary["valuation"][:5]) or "Sin productos")
+
+        if any(share for _, share in summary["abc"]):
+            self.analytics_panels["abc"].setText("\n".join(
+                f"{label}: {count:,} · {share:.0%} de ingresos"
+                for label, (count, share) in zip("ABC", summary["abc"])))
+        else:
+            self.analytics_panels["abc"].setText("Aún no hay ventas registradas")
+
+        cover = summary["cover"]
+        if cover["selling"]:
+            lines = [f"Mediana: {cover['median']:,.0f} días",
+                     f"Menos de {LOW_COVER_DAYS} días: {cover['low']:,}"]
+            lines += [f"• {name}: {days:.1f} días" for name, days in named(cover["lowest"])]
+            self.analytics_panels["cover"].setText("\n".join(lines))
+        else:
+            self.analytics_panels["cover"].setText("Aún no hay ventas registradas")
+
+        dead = summary["dead"]
+        lines = [f"{dead['count']:,} producto{'s' if dead['count'] != 1 else ''} "
+                 f"sin ventas en {DEAD_STOCK_DAYS} días",
+                 f"Valor inmovilizado: ${dead['value']:,.0f}"]
+        lines += [f"• {name}: ${value:,.0f}" for name, value in named(dead["top"])]
+        self.analytics_panels["dead"].setText("\n".join(lines))
+
+    @profiled("Dibujando gráficos")
     def draw_plots(self):
-        """Dibuja los gráficos con estilo"""
-        # Configurar colores según el tema
-        bg_color = self.current_theme['card_bg']
-        text_color = self.current_theme['text']
-        primary_color = self.current_theme['primary']
-        secondary_color = self.current_theme['secondary']
-        
-        # Gráfico de barras - Ganancias mensuales
-        self.canvas_monthly.figure.clear()
-        ax1 = self.canvas_monthly.figure.add_subplot(111)
+        """Muestra los gráficos; sólo se vuelven a dibujar si cambian las ventas, el tema o el tamaño"""
+        self._sales_version = order_ledger.version
+        # Los totales se leen aquí; el dibujo se hace en el hilo de gráficos
+        self.chart_monthly.show_chart(self._sales_version, self.current_theme, order_ledger.monthly_revenue())
+        self.chart_category.show_chart(self._sales_version, self.current_theme, order_ledger.category_revenue())
+
+    @staticmethod
+    def _plot_monthly(figure, theme, monthly):
+        """Gráfico de barras - Ganancias mensuales"""
+        text_color = theme['text']
+        months = [MONTH_NAMES[int(key[5:7]) - 1] for key, _ in monthly]
+        ganancias = [value for _, value in monthly]
+
+        ax1 = figure.add_subplot(111)
         ax1.set_facecolor('none')
         
-        bars = ax1.bar(self.months, self.ganancias, 
-                      color=primary_color, alpha=0.8, 
-                      edgecolor=secondary_color, linewidth=1.5)
+        bars = ax1.bar(months, ganancias, 
+                      color=theme['primary'], alpha=0.8, 
+                      edgecolor=theme['secondary'], linewidth=1.5)
         
         # Añadir valores en las barras
-        for bar, value in zip(bars, self.ganancias):
-            height = bar.get_height()
-            ax1.text(bar.get_x() + bar.get_width()/2., height + 500,
-                    f'${value/1000:.0f}K', ha='center', va='bottom',
-                    color=text_color, fontweight='bold', fontsize=9)
+        for bar, value in zip(bars, ganancias):
+            if not value:
+                continue
+            label = f'${value/1000:.0f}K' if value >= 1000 else f'${value:.0f}'
+            ax1.annotate(label, (bar.get_x() + bar.get_width()/2., bar.get_height()),
+                        xytext=(0, 3), textcoords='offset points', ha='center', va='bottom',
+                        color=text_color, fontweight='bold', fontsize=9)
         
         ax1.set_title('📈 Ganancias Mensuales', fontsize=16, fontweight='bold', 
                      color=text_color, pad=20)
@@ -1131,43 +4122,58 @@ class ReportsView(QWidget):
         ax1.spines['bottom'].set_color(text_color)
         ax1.grid(True, alpha=0.3, color=text_color)
         
-        self.canvas_monthly.figure.tight_layout()
-        self.canvas_monthly.draw()
+        figure.tight_layout()
+
+    @staticmethod
+    def _plot_category(figure, theme, category_revenue):
+        """Gráfico de pastel - Ventas por categoría"""
+        text_color = theme['text']
+        by_category = [(CATEGORY_LABELS.get(category, category), value)
+                       for category, value in category_revenue if value > 0]
 
-        # Gráfico de pastel - Ventas por categoría
-        self.canvas_category.figure.clear()
-        ax2 = self.canvas_category.figure.add_subplot(111)
+        ax2 = figure.add_subplot(111)
         ax2.set_facecolor('none')
         
-        colors = [primary_color, secondary_color, self.current_theme['accent'], self.current_theme['success']]
-        wedges, texts, autotexts = ax2.pie(self.ventas_categoria, labels=self.categorias, 
-                                          autopct='%1.1f%%', colors=colors, startangle=140,
-                                          textprops={'color': text_color, 'fontweight': 'bold'})
-        
-        # El texto del porcentaje
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-            autotext.set_fontsize(10)
+        colors = [theme['primary'], theme['secondary'], theme['accent'], theme['success']]
+        if by_category:
+            wedges, texts, autotexts = ax2.pie([value for _, value in by_category],
+                                              labels=[label for label, _ in by_category],
+                                              autopct='%1.1f%%', colors=colors, startangle=140,
+                                              textprops={'color': text_color, 'fontweight': 'bold'})
+
+            # El texto del porcentaje
+            for autotext in autotexts:
+                autotext.set_color('white')
+                autotext.set_fontweight('bold')
+                autotext.set_fontsize(10)
+        else:
+            ax2.axis('off')
+            ax2.text(0.5, 0.5, 'Aún no hay ventas registradas', ha='center', va='center',
+                     color=text_color, fontsize=12, transform=ax2.transAxes)
         
         ax2.set_title('🥧 Ventas por Categoría', fontsize=16, fontweight='bold', 
                      color=text_color, pad=20)
         
-        self.canvas_category.figure.tight_layout()
-        self.canvas_category.draw()
+        figure.tight_layout()
 
     def apply_theme(self, theme):
-        """Aplica el tema a la vista"""
+        """Muestra los gráficos con el tema; si ya se vio con este tema y tamaño no se redibujan"""
         self.current_theme = theme
-        self.setStyleSheet(f"background-color: {theme['background']};")
         self.draw_plots()
 
 class AccountView(QWidget):
     """Vista de cuenta completamente rediseñada y expandida"""
+    STORAGE_OPTIONS = {
+        "📄 Archivo JSON": "json",
+        "📝 JSON con diario de cambios": "journal",
+        "🗄️ Base de datos SQLite": "sqlite",
+    }
+
     def __init__(self, theme_callback):
         super().__init__()
         self.theme_callback = theme_callback
         self.user_data = user_data
+        set_theme_role(self, "view")
         
         layout = QVBoxLayout(self)
         layout.setContentsMargins(30, 30, 30, 30)
@@ -1185,14 +4191,7 @@ class AccountView(QWidget):
         # Avatar (círculo con iniciales)
         avatar_container = QFrame()
         avatar_container.setFixedSize(100, 100)
-        avatar_container.setStyleSheet(f"""
-            QFrame {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 {current_theme['gradient_start']}, stop:1 {current_theme['gradient_end']});
-                border-radius: 50px;
-                border: 3px solid {current_theme['border']};
-            }}
-        """)
+        set_theme_role(avatar_container, "avatar")
         
         avatar_label = QLabel(self.user_data['name'][:2].upper())
         avatar_label.setAlignment(Qt.AlignCenter)
@@ -1245,7 +4244,6 @@ class AccountView(QWidget):
         ]
         
         for card in user_stats_cards:
-            card.apply_theme(current_theme)
             user_stats_layout.addWidget(card)
         
         layout.addWidget(user_stats_container)
@@ -1290,9 +4288,6 @@ class AccountView(QWidget):
         scroll.setWidget(scroll_content)
         layout.addWidget(scroll)
 
-        self.apply_theme(current_theme)
-        profile_card.apply_theme(current_theme)
-
     def _create_appearance_section(self):
         """Crea la sección de apariencia"""
         card = ModernCard()
@@ -1338,19 +4333,7 @@ class AccountView(QWidget):
         
         for label_text, field in fields:
             field.setFixedHeight(40)
-            field.setStyleSheet(f"""
-                QLineEdit {{
-                    border: 2px solid {current_theme['border']};
-                    border-radius: 10px;
-                    padding: 10px 15px;
-                    font-size: 14px;
-                    color: {current_theme['text']};
-                    background-color: {current_theme['card_bg']};
-                }}
-                QLineEdit:focus {{
-                    border: 2px solid {current_theme['primary']};
-                }}
-            """)
+            set_theme_role(field, "field")
             layout.addRow(label_text, field)
         
         # Botón para guardar cambios
@@ -1379,19 +4362,7 @@ class AccountView(QWidget):
         
         for label_text, field in fields:
             field.setFixedHeight(40)
-            field.setStyleSheet(f"""
-                QLineEdit {{
-                    border: 2px solid {current_theme['border']};
-                    border-radius: 10px;
-                    padding: 10px 15px;
-                    font-size: 14px;
-                    color: {current_theme['text']};
-                    background-color: {current_theme['card_bg']};
-                }}
-                QLineEdit:focus {{
-                    border: 2px solid {current_theme['primary']};
-                }}
-            """)
+            set_theme_role(field, "field")
             layout.addRow(label_text, field)
         
         # Botón para guardar
@@ -1413,12 +4384,16 @@ class AccountView(QWidget):
         settings_data = [
             ("🔔 Notificaciones", "notifications", "Recibir notificaciones del sistema"),
             ("💾 Respaldo automático", "auto_backup", "Crear respaldos automáticos de datos"),
+            ("🔎 Búsqueda tolerante", "fuzzy_search", "Encontrar productos aunque falten acentos o haya errores de escritura"),
+            ("⚡ Precargar pantallas", "prewarm_views", "Preparar las demás pantallas en segundo plano tras el arranque"),
+            ("🪶 Efectos reducidos", "low_effects", "Quitar las sombras cuando hay muchos elementos en pantalla"),
         ]
         
         self.settings_checkboxes = {}
         
         for title, key, description in settings_data:
             setting_container = QFrame()
+            set_theme_role(setting_container, "setting")
             setting_layout = QVBoxLayout(setting_container)
             setting_layout.setContentsMargins(15, 10, 15, 10)
             setting_layout.setSpacing(5)
@@ -1430,24 +4405,7 @@ class AccountView(QWidget):
             
             checkbox = QCheckBox()
             checkbox.setChecked(self.user_data.get(key, True))
-            checkbox.setStyleSheet(f"""
-                QCheckBox::indicator {{
-                    width: 20px;
-                    height: 20px;
-                    border-radius: 10px;
-                    border: 2px solid {current_theme['border']};
-                    background-color: {current_theme['card_bg']};
-                }}
-                QCheckBox::indicator:checked {{
-                    background-color: {current_theme['primary']};
-                    border: 2px solid {current_theme['primary']};
-                }}
-                QCheckBox::indicator:checked::after {{
-                    content: "✓";
-                    color: white;
-                    font-weight: bold;
-                }}
-            """)
+            set_theme_role(checkbox, "switch")
             
             self.settings_checkboxes[key] = checkbox
             
@@ -1463,14 +4421,6 @@ class AccountView(QWidget):
             setting_layout.addLayout(title_layout)
             setting_layout.addWidget(desc_label)
             
-            setting_container.setStyleSheet(f"""
-                QFrame {{
-                    background-color: {current_theme['header_bg']};
-                    border-radius: 10px;
-                    border: 1px solid {current_theme['border']};
-                }}
-            """)
-            
             layout.addWidget(setting_container)
         
         # Botón para guardar configuraciones
@@ -1505,41 +4455,24 @@ class AccountView(QWidget):
         self.tax_rate_edit.setFixedHeight(40)
         self.tax_rate_edit.setPlaceholderText("Ej: 8.5")
         
+        # Almacenamiento del catálogo (se aplica al reiniciar)
+        self.storage_combo = QComboBox()
+        self.storage_combo.addItems(list(self.STORAGE_OPTIONS))
+        current_backend = self.user_data.get('storage_backend', STORAGE_BACKEND)
+        for label, backend in self.STORAGE_OPTIONS.items():
+            if backend == current_backend:
+                self.storage_combo.setCurrentText(label)
+        self.storage_combo.setFixedHeight(40)
+        
         fields = [
             ("🌐 Idioma:", self.language_combo),
             ("💰 Moneda:", self.currency_combo),
             ("📊 Tasa de impuestos (%):", self.tax_rate_edit),
+            ("🗄️ Almacenamiento:", self.storage_combo),
         ]
         
         for label_text, field in fields:
-            if isinstance(field, QComboBox):
-                field.setStyleSheet(f"""
-                    QComboBox {{
-                        border: 2px solid {current_theme['border']};
-                        border-radius: 10px;
-                        padding: 10px 15px;
-                        font-size: 14px;
-                        color: {current_theme['text']};
-                        background-color: {current_theme['card_bg']};
-                    }}
-                    QComboBox:hover {{
-                        border: 2px solid {current_theme['primary']};
-                    }}
-                """)
-            else:
-                field.setStyleSheet(f"""
-                    QLineEdit {{
-                        border: 2px solid {current_theme['border']};
-                        border-radius: 10px;
-                        padding: 10px 15px;
-                        font-size: 14px;
-                        color: {current_theme['text']};
-                        background-color: {current_theme['card_bg']};
-                    }}
-                    QLineEdit:focus {{
-                        border: 2px solid {current_theme['primary']};
-                    }}
-                """)
+            set_theme_role(field, "field")
             layout.addRow(label_text, field)
         
         # Botón para guardar preferencias
@@ -1581,8 +4514,20 @@ class AccountView(QWidget):
         except ValueError:
             QMessageBox.warning(self, "Error", "La tasa de impuestos debe ser un número válido.")
             return
+        backend = self.STORAGE_OPTIONS[self.storage_combo.currentText()]
+        backend_changed = type(product_store) is not PRODUCT_STORES[backend]
+        message = "Preferencias guardadas correctamente."
+        if backend_changed:
+            try:
+                switch_product_store(backend)
+            except (OSError, sqlite3.Error) as e:
+                QMessageBox.critical(self, "Error",
+                                     f"No se pudo pasar el catálogo al nuevo almacenamiento: {e}")
+                return
+            message += "\nEl catálogo se ha copiado al nuevo almacenamiento, que ya está en uso."
+        self.user_data['storage_backend'] = backend
         save_user_data(self.user_data)
-        QMessageBox.information(self, "Éxito", "Preferencias guardadas correctamente.")
+        QMessageBox.information(self, "Éxito", message)
 
     def apply_theme_change(self):
         """Aplica el cambio de tema"""
@@ -1593,38 +4538,86 @@ class AccountView(QWidget):
         if self.theme_callback:
             self.theme_callback(theme_name)
 
-    def apply_theme(self, theme):
-        """Aplica el tema a la vista"""
-        self.setStyleSheet(f"background-color: {theme['background']};")
-
-class LoadingThread(QThread):
-    """Hilo para simular carga"""
+def startup_prepare(report):
+    """Etapa de arranque: carpetas de trabajo y datos del usuario"""
+    global user_data
+    for directory in ("images", "icons", THUMBNAIL_DIR):
+        os.makedirs(directory, exist_ok=True)
+    user_data = load_user_data()
+
+def startup_load_catalog(report):
+    """Etapa de arranque: abre el almacenamiento configurado y carga el catálogo"""
+    global product_store, product_repository
+    product_store = create_product_store(user_data.get("storage_backend", STORAGE_BACKEND))
+    report(0.5)
+    product_repository = ProductRepository(product_store, product_store.load(), events=catalog_events)
+
+def startup_load_sales(report):
+    """Etapa de arranque: totales del libro de ventas"""
+    order_ledger.load(product_repository, report)
+
+def startup_build_index(report):
+    """Etapa de arranque: índice de búsqueda del catálogo"""
+    total = max(len(product_repository), 1)
+    for count, (product_id, product) in enumerate(product_repository.items(), 1):
+        search_index.add(product, product_id)
+        if count % 1000 == 0:
+            report(count / total)
+    product_repository.index = search_index
+
+def startup_warm_thumbnails(report):
+    """Etapa de arranque: miniaturas de las tarjetas que se ven al abrir Órdenes"""
+    first_products = itertools.islice(product_repository, STARTUP_WARM_THUMBNAILS)
+    thumbnail_loader.warm([p.image_path for p in first_products], 180, 150, report)
+
+# Etapas del arranque: (texto de la pantalla de carga, peso en la barra de progreso, función)
+STARTUP_STAGES = [
+    ("Preparando datos de usuario...", 5, startup_prepare),
+    ("Cargando productos...", 30, startup_load_catalog),
+    ("Cargando ventas...", 5, startup_load_sales),
+    ("Indexando productos...", 45, startup_build_index),
+    ("Preparando imágenes...", 20, startup_warm_thumbnails),
+]
+
+class StartupPipeline(QThread):
+    """Ejecuta las etapas de arranque fuera de la interfaz e informa del progreso real"""
     progress_updated = pyqtSignal(int)
     status_updated = pyqtSignal(str)
-    finished = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, stages=STARTUP_STAGES, parent=None):
+        super().__init__(parent)
+        self.stages = list(stages)
+        self.error = None
+        self._percent = -1
+
+    def _report(self, value):
+        percent = int(value)
+        if percent != self._percent:
+            self._percent = percent
+            self.progress_updated.emit(percent)
 
     def run(self):
-        steps = [
-            "Inicializando FoodWizz...",
-            "Cargando productos...",
-            "Configurando interfaz...",
-            "Aplicando temas...",
-            "Preparando gráficos...",
-            "Finalizando carga..."
-        ]
-        
-        for i, step in enumerate(steps):
-            self.status_updated.emit(step)
-            for j in range(17):  # 17 * 6 = 102, aproximadamente 100
-                progress = min(100, (i * 17) + j)
-                self.progress_updated.emit(progress)
-                self.msleep(50)
-        
-        self.progress_updated.emit(100)
-        self.finished.emit()
+        total = sum(weight for _, weight, _ in self.stages) or 1
+        done = 0
+        for text, weight, stage in self.stages:
+            self.status_updated.emit(text)
+            base = done
+            report = lambda fraction: self._report(100 * (base + weight * min(fraction, 1.0)) / total)
+            try:
+                with profile_phase(text.rstrip(".")):
+                    stage(report)
+            except Exception as e:
+                self.error = f"{text} {e}"
+                self.failed.emit(self.error)
+                return
+            done += weight
+            self._report(100 * done / total)
 
 class MainWindow(QMainWindow):
     """Ventana principal de la aplicación mejorada"""
+    VIEW_NAMES = ("Órdenes", "Inventario", "Reportes", "Mi Cuenta")
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("FoodWizz - Sistema de Gestión Avanzado")
@@ -1638,7 +4631,9 @@ class MainWindow(QMainWindow):
                  int((screen.height() - size.height()) / 2))
         
         self.current_theme_name = user_data.get('theme', 'Claro')
-        self.current_theme = THEME_LIGHT if self.current_theme_name == 'Claro' else THEME_DARK
+        if self.current_theme_name not in THEMES:
+            self.current_theme_name = 'Claro'
+        self.current_theme = THEMES[self.current_theme_name]
 
         # Widget central
         central_widget = QWidget()
@@ -1649,8 +4644,9 @@ class MainWindow(QMainWindow):
 
         # Menú lateral mejorado
         self.menu_container = QFrame()
+        self.menu_container.setObjectName("menuContainer")
         self.menu_container.setFixedWidth(280)
-        self.menu_container.setGraphicsEffect(ModernShadowEffect(self.menu_container, blur_radius=30, offset=QPoint(5, 0)))
+        self.menu_container.setGraphicsEffect(ModernShadowEffect(self.menu_container, blur_radius=30, offset=QPoint(5, 0), corner_radius=0))
         
         menu_layout = QVBoxLayout(self.menu_container)
         menu_layout.setContentsMargins(0, 0, 0, 0)
@@ -1684,6 +4680,7 @@ class MainWindow(QMainWindow):
         
         # Lista del menú
         self.menu = QListWidget()
+        self.menu.setObjectName("menu")
         self.menu.setCursor(QCursor(Qt.PointingHandCursor))
 
         # Items del menú con iconos
@@ -1728,14 +4725,7 @@ class MainWindow(QMainWindow):
         mini_avatar = QLabel(user_data['name'][:2].upper())
         mini_avatar.setFixedSize(40, 40)
         mini_avatar.setAlignment(Qt.AlignCenter)
-        mini_avatar.setStyleSheet(f"""
-            background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                stop:0 {self.current_theme['gradient_start']}, stop:1 {self.current_theme['gradient_end']});
-            border-radius: 20px;
-            color: white;
-            font-weight: bold;
-            font-size: 14px;
-        """)
+        mini_avatar.setObjectName("miniAvatar")
         
         user_info_text = QVBoxLayout()
         user_name = QLabel(user_data['name'])
@@ -1755,98 +4745,344 @@ class MainWindow(QMainWindow):
         
         main_layout.addWidget(self.menu_container)
 
-        # Contenedor de vistas
+        # Contenedor de vistas: cada vista se crea la primera vez que se muestra
         self.stacked_layout = QStackedLayout()
-        
-        # Crear vistas
-        self.orders_view = OrdersView()
-        self.inventory_view = InventoryView()
-        self.reports_view = ReportsView()
-        self.account_view = AccountView(self.apply_theme)
-
-        self.stacked_layout.addWidget(self.orders_view)
-        self.stacked_layout.addWidget(self.inventory_view)
-        self.stacked_layout.addWidget(self.reports_view)
-        self.stacked_layout.addWidget(self.account_view)
+        self._view_factories = [OrdersView, InventoryView, ReportsView, lambda: AccountView(self.apply_theme)]
+        self._views = [None] * len(self._view_factories)
+        # Vistas ocultas cuyo tema quedó pendiente; se actualizan al mostrarse
+        self._theme_pending = [False] * len(self._view_factories)
+        for _ in self._view_factories:
+            self.stacked_layout.addWidget(QWidget())
 
         main_layout.addLayout(self.stacked_layout)
 
+        # Precarga de las vistas restantes cuando la interfaz está libre
+        self._prewarm_timer = QTimer(self)
+        self._prewarm_timer.setSingleShot(True)
+        self._prewarm_timer.timeout.connect(self._prewarm_next_view)
+        if user_data.get("prewarm_views", True):
+            self._prewarm_timer.start(VIEW_PREWARM_DELAY_MS)
+
+        # Modo de efectos reducidos; se revisa al cambiar de vista o de tamaño
+        self._effects_timer = QTimer(self)
+        self._effects_timer.setSingleShot(True)
+        self._effects_timer.setInterval(200)
+        self._effects_timer.timeout.connect(self.update_effects)
+
+        # Errores de guardado sin bloquear la interfaz
+        persistence_worker.save_failed.connect(self.show_save_error)
+
         # Conectar eventos
         self.menu.currentRowChanged.connect(self.display_view)
+        self.apply_theme(self.current_theme_name)
         self.menu.setCurrentRow(0)
 
-        self.apply_theme(self.current_theme_name)
+    def view(self, index):
+        """Devuelve la vista index, creándola si todavía no existe"""
+        view = self._views[index]
+        if view is None:
+            with profile_phase(f"Creando vista {self.VIEW_NAMES[index]}"):
+                view = self._views[index] = self._view_factories[index]()
+                theme_engine.apply(view)
+                if hasattr(view, "shadowed_items_changed"):
+                    view.shadowed_items_changed.connect(self._effects_timer.start)
+            placeholder = self.stacked_layout.widget(index)
+            current = self.stacked_layout.currentIndex()
+            self.stacked_layout.insertWidget(index, view)
+            self.stacked_layout.removeWidget(placeholder)
+            placeholder.deleteLater()
+            self.stacked_layout.setCurrentIndex(current)
+            # La vista pinta su fondo; el menú va encima para que su sombra siga viéndose
+            self.menu_container.raise_()
+        return view
+
+    @property
+    def orders_view(self):
+        return self.view(0)
+
+    @property
+    def inventory_view(self):
+        return self.view(1)
+
+    @property
+    def reports_view(self):
+        return self.view(2)
+
+    @property
+    def account_view(self):
+        return self.view(3)
+
+    def _prewarm_next_view(self):
+        """Crea una vista pendiente y programa la siguiente"""
+        pending = [i for i, view in enumerate(self._views) if view is None]
+        if not pending:
+            return
+        self.view(pending[0])
+        if len(pending) > 1:
+            self._prewarm_timer.start(VIEW_PREWARM_INTERVAL_MS)
 
     def display_view(self, index):
         """Cambia la vista actual con animación"""
+        built = self._views[index] is not None
+        view = self.view(index)
+        if self._theme_pending[index]:
+            self._retheme_view(index)
         self.stacked_layout.setCurrentIndex(index)
         
-        # Actualizar vistas según sea necesario
-        if index == 0:  # Órdenes
-            self.orders_view.update_product_grid()
-        elif index == 1:  # Inventario
-            self.inventory_view.update_inventory_table()
-        elif index == 2:  # Reportes
-            self.reports_view.draw_plots()
+        # Sólo se refrescan las vistas cuyo catálogo cambió; el tema pendiente ya se aplicó arriba
+        if built and index in (0, 1, 2):
+            view.refresh_if_stale()
+        self.update_effects()
 
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._effects_timer.start()
+
+    def paintEvent(self, event):
+        # Fondo de la ventana con el tema; una hoja de estilos aquí volvería a pulir todas las vistas
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), QColor(self.current_theme["background"]))
+
+    def update_effects(self):
+        """Quita las sombras de la vista visible si muestra más de LOW_EFFECTS_THRESHOLD elementos con sombra"""
+        view = self._views[self.stacked_layout.currentIndex()]
+        if view is None:
+            return
+        effects = [widget.graphicsEffect() for widget in view.findChildren(QWidget)
+                   if isinstance(widget.graphicsEffect(), ModernShadowEffect) and widget.isVisibleTo(view)]
+        shadowed = len(effects) + (view.shadowed_items() if hasattr(view, "shadowed_items") else 0)
+        enabled = not (user_data.get("low_effects", True) and shadowed > LOW_EFFECTS_THRESHOLD)
+        for effect in effects:
+            effect.setEnabled(enabled)
+        if hasattr(view, "set_item_shadows"):
+            view.set_item_shadows(enabled)
+
+    def show_save_error(self, path, error):
+        """Muestra un error de guardado en la barra de estado"""
+        # La barra se crea con el primer error: hasta entonces no ocupa sitio
+        status_bar = self.statusBar()
+        theme_engine.apply(status_bar)
+        status_bar.showMessage(f"⚠️ No se pudo guardar {os.path.basename(path)}: {error}", 15000)
+
+    @profiled("Aplicando tema")
     def apply_theme(self, theme_name):
         """Aplica el tema a toda la aplicación"""
         global current_theme
-        if theme_name == "Oscuro":
-            self.current_theme = THEME_DARK
-            current_theme = THEME_DARK
-        else:
-            self.current_theme = THEME_LIGHT
-            current_theme = THEME_LIGHT
-        
-        # Aplicar estilo a la ventana principal
-        self.setStyleSheet(f"""
-            QMainWindow {{
-                background-color: {self.current_theme['background']};
-            }}
-        """)
-
-        # Estilo del contenedor del menú
-        self.menu_container.setStyleSheet(f"""
-            QFrame {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 {self.current_theme['gradient_start']}, stop:1 {self.current_theme['gradient_end']});
-                border: none;
-            }}
-        """)
-
-        # Estilo del menú
-        self.menu.setStyleSheet(f"""
-            QListWidget {{
-                background-color: transparent;
-                border: none;
-                padding: 10px 0px;
-                outline: 0;
-            }}
-            QListWidget::item {{
-                border-radius: 15px;
-                margin: 5px 15px;
-                padding: 0px;
-            }}
-            QListWidget::item:hover {{
-                background-color: rgba(255, 255, 255, 0.1);
-            }}
-            QListWidget::item:selected {{
-                background-color: rgba(255, 255, 255, 0.2);
-                border: 2px solid rgba(255, 255, 255, 0.3);
-            }}
-        """)
-        
-        # Aplicar tema a las vistas
-        self.orders_view.apply_theme(self.current_theme)
-        self.inventory_view.apply_theme(self.current_theme)
-        self.reports_view.apply_theme(self.current_theme)
-        self.account_view.apply_theme(self.current_theme)
+        if theme_name not in THEMES:
+            theme_name = "Claro"
+        self.current_theme = current_theme = THEMES[theme_name]
+
+        # La hoja de estilos del tema se genera una vez y se aplica al menú y a la vista visible;
+        # las vistas ocultas se actualizan al mostrarse y las que aún no existen, al crearse
+        theme_engine.active = theme_name
+        theme_engine.apply(self.menu_container)
+        status_bar = self.findChild(QStatusBar, options=Qt.FindDirectChildrenOnly)
+        if status_bar is not None:
+            theme_engine.apply(status_bar)
+        self.update()  # Fondo de la ventana
+        current = self.stacked_layout.currentIndex()
+        for index, view in enumerate(self._views):
+            if view is None:
+                continue
+            if index == current:
+                self._retheme_view(index)
+            else:
+                self._theme_pending[index] = True
+
+    def _retheme_view(self, index):
+        """Lleva una vista ya creada al tema activo: hoja de estilos y lo que se pinta a mano"""
+        self._theme_pending[index] = False
+        view = self._views[index]
+        if theme_engine.apply(view) and hasattr(view, "apply_theme"):
+            view.apply_theme(self.current_theme)
+
+def check_import_time(budget_ms=IMPORT_TIME_BUDGET_MS, runs=3):
+    """Mide la importación de la aplicación en procesos nuevos; devuelve 0 si cabe en el presupuesto"""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    module = os.path.splitext(os.path.basename(__file__))[0]
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=app_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"Error importando {module}:\n{result.stderr.strip()}")
+            return 1
+        # Líneas "import time: propio | acumulado | módulo", en microsegundos
+        timings = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                timings[name.strip()] = int(cumulative) / 1000
+        if module not in timings:
+            # Sin su línea no hay medida: no puede darse por buena
+            print(f"No se encontró el tiempo de importación de {module} en la salida de -X importtime")
+            return 1
+        if best is None or timings[module] < best[module]:
+            best = timings
+
+    total = best[module]
+    print(f"Importación de {module}: {total:.0f} ms (presupuesto {budget_ms:.0f} ms)")
+    if total <= budget_ms:
+        return 0
+    print("Importaciones más lentas:")
+    slowest = sorted(((ms, name) for name, ms in best.items() if name != module), reverse=True)
+    for ms, name in slowest[:10]:
+        print(f"  {ms:8.1f} ms  {name}")
+    return 1
+
+def benchmark_analytics(count=1_000_000, budget_ms=ANALYTICS_BUDGET_MS, runs=5):
+    """Mide la analítica con count productos sintéticos, la mitad con ventas; devuelve 0 si cabe en el presupuesto.
+
+    La copia en el hilo de la interfaz y cada cálculo deben durar budget_ms como
+    mucho, y la analítica completa en segundo plano ANALYTICS_TOTAL_BUDGET_MS.
+    """
+    numpy = get_numpy()
+    if numpy is None:
+        print("La analítica del inventario necesita NumPy")
+        return 1
+    print(f"Preparando {count:,} productos y {count // 2:,} con ventas...")
+    rng = numpy.random.default_rng(0)
+    prices = rng.uniform(1, 50, count).round(2).tolist()
+    stocks = rng.integers(0, 200, count).tolist()
+    categories = [f"Categoría {code}" for code in range(8)]
+    category_codes = rng.integers(0, 8, count).tolist()
+    repository = ProductRepository(None, make_catalog(
+        (f"Producto {i}", prices[i], "images/placeholder.png", categories[category_codes[i]], stocks[i])
+        for i in range(count)))
+    # Ventas con cola larga: pocos productos concentran la mayoría de los ingresos
+    ledger = OrderLedger()
+    first_day = date.today().toordinal() - 365
+    days = [date.fromordinal(first_day + offset).isoformat() for offset in range(366)]
+    quantities = (rng.pareto(1.2, count) * 10).astype(numpy.int64) + 1
+    sale_days = rng.integers(0, 366, count).tolist()
+    for row, product_id in enumerate(repository.ids()):
+        if row % 2 == 0:
+            product = repository.get(product_id)
+            ledger._apply([days[sale_days[row]], row + 1, product_id, product.name, product.category,
+                           int(quantities[row]), product.price])
+            ledger._track(product_id)
+
+    snapshot = analytics_snapshot(repository, ledger)
+    (prices, stocks, category_codes, categories), _, (revenue, units, idle_days, observed) = snapshot
+    steps = [
+        ("Copia en el hilo de la interfaz", budget_ms, lambda: analytics_snapshot(repository, ledger)),
+        ("Valoración por categoría", budget_ms,
+         lambda: inventory_valuation(prices, stocks, category_codes, len(categories))),
+        ("Clasificación ABC", budget_ms, lambda: abc_classes(revenue)),
+        ("Días de cobertura", budget_ms, lambda: days_of_cover(stocks, units, observed)),
+        ("Stock muerto", budget_ms, lambda: dead_stock(stocks, idle_days)),
+        ("Analítica completa en segundo plano", ANALYTICS_TOTAL_BUDGET_MS, lambda: inventory_analytics(snapshot)),
+    ]
+    print(f"Analítica de {count:,} productos (mejor de {runs})")
+    within_budget = True
+    for name, budget, step in steps:
+        best = None
+        for _ in range(runs):
+            started = time.perf_counter()
+            step()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        within_budget = within_budget and best <= budget
+        print(f"  {best:8.1f} ms  {name} (presupuesto {budget:.0f} ms)")
+    return 0 if within_budget else 1
+
+def finish_startup_profile(window, prefix):
+    """Mide también las vistas aún sin crear y el cambio de tema, escribe el informe y sale"""
+    global startup_profiler
+    window._prewarm_timer.stop()
+    for index in range(len(window.VIEW_NAMES)):
+        window.view(index)
+    active = theme_engine.active
+    window.apply_theme(next(name for name in THEMES if name != active))
+    window.apply_theme(active)
+    report = startup_profiler.write(prefix)
+    startup_profiler = None
+    print(f"Informe de arranque: {prefix}.json, {prefix}.txt"
+          + (f", {report['cprofile']}" if report["cprofile"] else ""))
+    QApplication.instance().quit()
+
+def measure_theme_switch(window, runs=6):
+    """Mide, con cada vista en pantalla, el cambio de tema y lo que tarda en mostrarse tras uno hecho con ella oculta"""
+    app = QApplication.instance()
+    window._prewarm_timer.stop()
+    for index in range(len(window.VIEW_NAMES)):
+        window.view(index)
+    original = theme_engine.active
+
+    def toggle():
+        window.apply_theme(next(name for name in THEMES if name != theme_engine.active))
+
+    def elapsed_ms(action):
+        started = time.perf_counter()
+        action()
+        app.processEvents()
+        return (time.perf_counter() - started) * 1000
+
+    results = {}
+    for index, view_name in enumerate(window.VIEW_NAMES):
+        hidden = (index + 1) % len(window.VIEW_NAMES)
+        switch, display = [], []
+        for _ in range(runs):
+            window.menu.setCurrentRow(index)
+            app.processEvents()
+            switch.append(elapsed_ms(toggle))
+            window.menu.setCurrentRow(hidden)
+            app.processEvents()
+            toggle()
+            display.append(elapsed_ms(lambda: window.menu.setCurrentRow(index)))
+        results[view_name] = {"switch_ms": sorted(switch)[runs // 2], "switch_max_ms": max(switch),
+                              "display_ms": sorted(display)[runs // 2], "display_max_ms": max(display)}
+    window.apply_theme(original)
+    window.menu.setCurrentRow(0)
+    return results
+
+def finish_theme_benchmark(window, runs):
+    """Imprime la latencia del cambio de tema por vista y sale"""
+    results = measure_theme_switch(window, runs)
+    print(f"Cambio de tema ({runs} repeticiones, mediana / máximo)")
+    print(f"{'Vista':<14}{'Con la vista visible':>26}{'Al volver a la vista':>26}")
+    for view_name, r in results.items():
+        print(f"{view_name:<14}{r['switch_ms']:>12.1f}ms / {r['switch_max_ms']:>7.1f}ms"
+              f"{r['display_ms']:>12.1f}ms / {r['display_max_ms']:>7.1f}ms")
+    QApplication.instance().quit()
+
+def parse_args(argv):
+    """Opciones de línea de comandos; las que no son nuestras se pasan a Qt"""
+    parser = argparse.ArgumentParser(description="FoodWizz - Sistema de Gestión Avanzado")
+    parser.add_argument("--check-import-time", nargs="?", type=float, const=IMPORT_TIME_BUDGET_MS,
+                        metavar="MS", help="comprueba que importar la aplicación no supera MS milisegundos")
+    parser.add_argument("--profile-startup", nargs="?", const="startup_profile", metavar="PREFIJO",
+                        help="mide cada fase del arranque, escribe PREFIJO.json y PREFIJO.txt y sale")
+    parser.add_argument("--profile-cprofile", action="store_true",
+                        help="con --profile-startup, guarda también PREFIJO.prof (cProfile) de la fase más lenta")
+    parser.add_argument("--measure-theme", nargs="?", type=int, const=6, metavar="N",
+                        help="mide N cambios de tema con cada vista en pantalla, imprime las latencias y sale")
+    parser.add_argument("--benchmark-analytics", nargs="?", type=int, const=1_000_000, metavar="N",
+                        help="mide la analítica del inventario con N productos sintéticos y sale")
+    return parser.parse_known_args(argv)
 
 def main():
     """Función principa"""
-    app = QApplication(sys.argv)
+    global startup_profiler
+    args, qt_args = parse_args(sys.argv[1:])
+    if args.check_import_time is not None:
+        sys.exit(check_import_time(args.check_import_time))
+    if args.benchmark_analytics is not None:
+        sys.exit(benchmark_analytics(args.benchmark_analytics))
+    if args.profile_startup:
+        startup_profiler = StartupProfiler(_import_started, args.profile_cprofile)
+        startup_profiler.record("Importando el módulo", *_import_started)
+    splash_started = (time.perf_counter(), time.process_time())
+
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle('Fusion')  # Estilo moderno
+    app.aboutToQuit.connect(thumbnail_loader.shutdown)
+    app.aboutToQuit.connect(chart_renderer.shutdown)
+    app.aboutToQuit.connect(analytics_worker.shutdown)
+    app.aboutToQuit.connect(order_ledger.close)
+    app.aboutToQuit.connect(persistence_worker.stop)
     
     # Configurar fuente de la aplicación
     font = QFont("Segoe UI", 10)
@@ -1905,19 +5141,43 @@ def main():
     status_label.setGeometry(100, splash_pix.height() - 50, splash_pix.width() - 200, 20)
     status_label.setAlignment(Qt.AlignCenter)
     status_label.setStyleSheet("color: white; font-size: 12px; font-weight: 600;")
+    if startup_profiler is not None:
+        startup_profiler.record("Creando QApplication y pantalla de carga", *splash_started)
+
+    # Arranque real por etapas; la ventana se abre en cuanto terminan
+    window = None
+
+    def open_main_window():
+        nonlocal window
+        if pipeline.error is not None:
+            splash.close()
+            QMessageBox.critical(None, "Error de arranque", f"No se pudo iniciar FoodWizz:\n{pipeline.error}")
+            app.exit(1)
+            return
+        status_label.setText("Abriendo ventana...")
+        app.processEvents()
+        with profile_phase("Creando ventana principal"):
+            window = MainWindow()
+        with profile_phase("Mostrando ventana"):
+            window.show()
+            splash.finish(window)
+            app.processEvents()
+        if startup_profiler is not None:
+            startup_profiler.mark_interactive()
+            QTimer.singleShot(0, lambda: finish_startup_profile(window, args.profile_startup))
+        elif args.measure_theme:
+            QTimer.singleShot(0, lambda: finish_theme_benchmark(window, args.measure_theme))
+
+        # Limpieza de miniaturas huérfanas en segundo plano
+        threading.Thread(target=thumbnail_disk_cache.prune,
+                         args=(product_repository.image_paths(),), daemon=True).start()
+
+    pipeline = StartupPipeline()
+    pipeline.progress_updated.connect(progress.setValue)
+    pipeline.status_updated.connect(status_label.setText)
+    pipeline.finished.connect(open_main_window)
+    pipeline.start()
 
-    # Simular carga con hilo
-    loading_thread = LoadingThread()
-    loading_thread.progress_updated.connect(progress.setValue)
-    loading_thread.status_updated.connect(status_label.setText)
-    loading_thread.finished.connect(lambda: [splash.finish(window), window.show()])
-    
-    loading_thread.start()
-
-    # Crear ventana principal
-    window = MainWindow()
-    
-    app.processEvents()
     sys.exit(app.exec_())
 
 if __name__ == '__main__':